@@ -1,11 +1,17 @@
 import os
+import logging
 from flask import Flask
-from .extensions import db
+from .extensions import db, consult_cache, llm, catalog_cache, metrics, ratelimiter
+from .database import engine_options
 from flask_cors import CORS
 
 def create_app():
     app = Flask(__name__)
 
+    # 日志：app.* 模块统一用 logging 输出，级别由 LOG_LEVEL 控制（默认 INFO）
+    logging.basicConfig(format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+    logging.getLogger('app').setLevel(os.environ.get('LOG_LEVEL', 'INFO').upper())
+
     basedir = os.path.abspath(os.path.dirname(__file__))
     app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev-key-change-this')
 
@@ -21,24 +27,94 @@ def create_app():
         app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(basedir, '../data/mediguide.db')
 
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    # 连接池 / 探活 / 超时，均由 DB_* 环境变量控制，见 app/database.py
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
+    app.config['AUTO_INIT_DB'] = os.environ.get('AUTO_INIT_DB', '0' if os.environ.get('VERCEL') else '1') != '0'
+
+    # DeepSeek / OpenAI 兼容上游：超时（秒）、重试次数、同时在途请求上限及排队等待时间
+    app.config['DEEPSEEK_API_KEY'] = os.environ.get('DEEPSEEK_API_KEY')
+    app.config['DEEPSEEK_BASE_URL'] = os.environ.get('DEEPSEEK_BASE_URL', 'https://api.deepseek.com')
+    app.config['LLM_TIMEOUT'] = float(os.environ.get('LLM_TIMEOUT', 60))
+    app.config['LLM_CONNECT_TIMEOUT'] = float(os.environ.get('LLM_CONNECT_TIMEOUT', 5))
+    app.config['LLM_MAX_RETRIES'] = int(os.environ.get('LLM_MAX_RETRIES', 2))
+    app.config['LLM_MAX_CONCURRENCY'] = int(os.environ.get('LLM_MAX_CONCURRENCY', 8))
+    app.config['LLM_QUEUE_TIMEOUT'] = float(os.environ.get('LLM_QUEUE_TIMEOUT', 2))
+    # ASGI 异步流式聊天（asgi.py）单进程允许的同时在途流数
+    app.config['LLM_ASYNC_MAX_CONCURRENCY'] = int(os.environ.get('LLM_ASYNC_MAX_CONCURRENCY', 256))
+
+    # 流式聊天的帧合并窗口：最早的 token 等待超过该毫秒数或累计超过该字节数时发送一帧，0 表示逐 token 发送
+    app.config['CHAT_COALESCE_MS'] = float(os.environ.get('CHAT_COALESCE_MS', 30))
+    app.config['CHAT_COALESCE_BYTES'] = int(os.environ.get('CHAT_COALESCE_BYTES', 256))
+
+    # 流式聊天的上下文预算（估算的 token 数）：始终保留 system 提示词和最近 CHAT_KEEP_RECENT 条消息，
+    # 更早的轮次超出预算时压缩成摘要（CHAT_SUMMARIZE=0 时直接丢弃）；CHAT_KB_TOP_K 为注入的知识库条目数，0 关闭
+    app.config['CHAT_TOKEN_BUDGET'] = int(os.environ.get('CHAT_TOKEN_BUDGET', 6000))
+    app.config['CHAT_KEEP_RECENT'] = int(os.environ.get('CHAT_KEEP_RECENT', 6))
+    app.config['CHAT_SUMMARIZE'] = os.environ.get('CHAT_SUMMARIZE', '1') != '0'
+    app.config['CHAT_KB_TOP_K'] = int(os.environ.get('CHAT_KB_TOP_K', 3))
+
+    # 药品检索：auto（PostgreSQL 用 ILIKE + pg_trgm，其它用内存倒排索引）/ memory / postgres
+    app.config['MEDICINE_SEARCH_BACKEND'] = os.environ.get('MEDICINE_SEARCH_BACKEND', 'auto')
+    app.config['MEDICINES_PER_PAGE'] = int(os.environ.get('MEDICINES_PER_PAGE', 24))
+    app.config['SEARCH_INDEX_MAX_AGE'] = int(os.environ.get('SEARCH_INDEX_MAX_AGE', 300))
+
+    # 服药时间点预先展开的天数；剩余不足一半时在读取时顺延
+    app.config['DOSE_SLOT_WINDOW_DAYS'] = int(os.environ.get('DOSE_SLOT_WINDOW_DAYS', 14))
+
+    # 我的药箱每页条目数
+    app.config['CABINET_PER_PAGE'] = int(os.environ.get('CABINET_PER_PAGE', 20))
+
+    # 药品目录缓存：条目上限，以及各 worker 检查目录版本号的间隔（秒）
+    app.config['CATALOG_CACHE_ENABLED'] = os.environ.get('CATALOG_CACHE_ENABLED', '1') != '0'
+    app.config['CATALOG_CACHE_SIZE'] = int(os.environ.get('CATALOG_CACHE_SIZE', 512))
+    app.config['CATALOG_VERSION_CHECK_INTERVAL'] = float(os.environ.get('CATALOG_VERSION_CHECK_INTERVAL', 30))
+
+    # AI 问诊：知识库检索参数
+    app.config['CONSULT_TOP_K'] = int(os.environ.get('CONSULT_TOP_K', 3))
+    app.config['CONSULT_MIN_SCORE'] = float(os.environ.get('CONSULT_MIN_SCORE', 0.2))
+    app.config['CONSULT_DECISIVE_SCORE'] = float(os.environ.get('CONSULT_DECISIVE_SCORE', 0.75))
+
+    # AI 问诊结果缓存：memory（默认，进程内 LRU）/ database（多 worker 共享）/ none
+    app.config['CONSULT_CACHE_BACKEND'] = os.environ.get('CONSULT_CACHE_BACKEND', 'memory')
+    app.config['CONSULT_CACHE_SIZE'] = int(os.environ.get('CONSULT_CACHE_SIZE', 1024))
+    app.config['CONSULT_CACHE_TTL'] = int(os.environ.get('CONSULT_CACHE_TTL', 3600))
+
+    # 大模型接口限流（令牌桶，"容量/秒数"，0 关闭）：登录用户按用户、否则按 IP 计数；
+    # memory（默认，进程内）/ database（多 worker 共享）；部署在 N 层反向代理后时设置 RATELIMIT_TRUST_PROXY=N，
+    # 按 X-Forwarded-For 从右数第 N 个地址计数（0 表示不信任该请求头）
+    app.config['RATELIMIT_ENABLED'] = os.environ.get('RATELIMIT_ENABLED', '1') != '0'
+    app.config['RATELIMIT_BACKEND'] = os.environ.get('RATELIMIT_BACKEND', 'memory')
+    app.config['RATELIMIT_CONSULT'] = os.environ.get('RATELIMIT_CONSULT', '20/60')
+    app.config['RATELIMIT_CHAT'] = os.environ.get('RATELIMIT_CHAT', '10/60')
+    app.config['RATELIMIT_TRUST_PROXY'] = int(os.environ.get('RATELIMIT_TRUST_PROXY', 0))
+
+    # 指标：/metrics（Prometheus 文本格式），抓取需带 Authorization: Bearer <METRICS_TOKEN>，未配置令牌时只在调试模式下开放；
+    # Server-Timing 响应头会暴露每个请求的 SQL 条数与耗时，只在调试模式或 METRICS_SERVER_TIMING=1 时输出
+    app.config['METRICS_ENABLED'] = os.environ.get('METRICS_ENABLED', '1') != '0'
+    app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN')
+    app.config['METRICS_SERVER_TIMING'] = os.environ.get('METRICS_SERVER_TIMING', '0') != '0'
 
     db.init_app(app)
+    consult_cache.init_app(app)
+    llm.init_app(app)
+    catalog_cache.init_app(app)
+    metrics.init_app(app)
+    ratelimiter.init_app(app)
     CORS(app)
 
     # Register Blueprints
     from .routes import main as main_blueprint
     app.register_blueprint(main_blueprint)
 
-    # Initialize DB (Create tables)
-    with app.app_context():
-        # Import models inside context to avoid circular imports 
-        # (Though best practice is usually separate models file imported at top but let's be safe)
-        from . import models
-        db.create_all()
-        
-        # Seed basic medicines if empty
-        if not models.Medicine.query.first():
-            from .seed import seed_medicines
-            seed_medicines(db)
+    # CLI: flask --app run init-db / seed / upgrade-db
+    from .commands import register_commands
+    register_commands(app)
+
+    # 本地开发默认在启动时建表并导入种子数据；Serverless（Vercel）冷启动时跳过，
+    # 改为部署时执行一次 flask --app run init-db，避免首个请求前就访问远程数据库
+    if app.config['AUTO_INIT_DB']:
+        with app.app_context():
+            from .commands import init_db
+            init_db()
 
     return app
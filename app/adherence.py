@@ -0,0 +1,165 @@
+"""服药依从性：按 (计划, 日期) 预聚合的日汇总表 adherence_daily。
+
+每次打卡在同一事务里按实际新增的记录数累加当天的 taken；统计接口只读汇总表和计划本身，
+查询代价取决于日期范围内的天数和计划数，与积累了多少年的原始服药记录无关。
+已有的服药记录用 flask --app run backfill-adherence 一次性汇总。
+"""
+from datetime import date, datetime, timedelta
+from sqlalchemy import func
+from .extensions import db
+from .database import dialect_insert
+from .models import Medicine, UserMedicine, Schedule, ScheduleTime, IntakeLog, AdherenceDaily
+
+# 单次统计最多覆盖的天数
+MAX_RANGE_DAYS = 366
+
+
+def _times_count():
+    """每个计划每天的服药次数（全表聚合，只用于回填）"""
+    return (
+        db.session.query(ScheduleTime.schedule_id, func.count(ScheduleTime.id).label('n'))
+        .group_by(ScheduleTime.schedule_id)
+        .subquery()
+    )
+
+
+def upsert_daily(rows, increment=True):
+    """rows 为 [{user_id, user_medicine_id, schedule_id, date, planned, taken}]。
+
+    increment 时把 taken 累加到已有的当天汇总上（打卡时传入新增条数）；否则直接覆盖（回填时使用）。
+    """
+    if not rows:
+        return
+    stmt = dialect_insert(AdherenceDaily)
+    taken = AdherenceDaily.taken + stmt.excluded.taken if increment else stmt.excluded.taken
+    db.session.execute(stmt.on_conflict_do_update(
+        index_elements=['schedule_id', 'date'],
+        set_={'planned': stmt.excluded.planned, 'taken': taken},
+    ), rows)
+
+
+def record_taken(user_id, schedules, inserted, planned):
+    """打卡后更新日汇总。inserted 为实际写入的 (schedule_id, date_str) 列表，planned 为 {schedule_id: 每天次数}"""
+    counts = {}
+    for key in inserted:
+        counts[key] = counts.get(key, 0) + 1
+    upsert_daily([{
+        'user_id': user_id,
+        'user_medicine_id': schedules[schedule_id].user_medicine_id,
+        'schedule_id': schedule_id,
+        'date': date.fromisoformat(date_str),
+        'planned': planned[schedule_id],
+        'taken': min(n, planned[schedule_id]),
+    } for (schedule_id, date_str), n in counts.items()])
+
+
+def backfill(batch_size=1000):
+    """由全部服药记录重建日汇总，可重复执行；返回写入的行数"""
+    times = _times_count()
+    query = (
+        db.session.query(UserMedicine.user_id, Schedule.user_medicine_id, IntakeLog.schedule_id,
+                         IntakeLog.date_str, func.coalesce(times.c.n, 0), func.count(IntakeLog.id))
+        .join(Schedule, IntakeLog.schedule_id == Schedule.id)
+        .join(UserMedicine, Schedule.user_medicine_id == UserMedicine.id)
+        .outerjoin(times, times.c.schedule_id == Schedule.id)
+        .group_by(UserMedicine.user_id, Schedule.user_medicine_id, IntakeLog.schedule_id, IntakeLog.date_str, times.c.n)
+    )
+    written, batch = 0, []
+    for user_id, user_medicine_id, schedule_id, date_str, planned, taken in query:
+        try:
+            day = date.fromisoformat(date_str)
+        except ValueError:
+            continue
+        batch.append({'user_id': user_id, 'user_medicine_id': user_medicine_id, 'schedule_id': schedule_id,
+                      'date': day, 'planned': planned, 'taken': min(taken, planned)})
+        if len(batch) >= batch_size:
+            upsert_daily(batch, increment=False)
+            written += len(batch)
+            batch = []
+    upsert_daily(batch, increment=False)
+    written += len(batch)
+    db.session.commit()
+    return written
+
+
+def _rate(taken, planned):
+    return round(taken / planned, 4) if planned else None
+
+
+def adherence_report(user_id, start, end, user_medicine_id=None, schedule_id=None, now=None):
+    """[start, end] 内的依从性：总计、逐日、逐计划。
+
+    没有汇总行的日子（一次都没服）按计划的服药次数计入应服、已服为 0。
+    今天之后的日子不计入（end 截止到今天）；今天只计入已到时间的服药次数，提前服下的也算作应服。
+    """
+    if end < start:
+        raise ValueError('end date is before start date')
+    if (end - start).days >= MAX_RANGE_DAYS:
+        raise ValueError(f'date range exceeds {MAX_RANGE_DAYS} days')
+    now = now or datetime.now()
+    today = now.date()
+    end = min(end, today)
+
+    query = (
+        db.session.query(Schedule.id, Schedule.user_medicine_id, Schedule.start_date, Schedule.end_date, Medicine.name)
+        .join(UserMedicine, Schedule.user_medicine_id == UserMedicine.id)
+        .join(Medicine, UserMedicine.medicine_id == Medicine.id)
+        .filter(UserMedicine.user_id == user_id, Schedule.start_date <= end, Schedule.end_date >= start)
+    )
+    if user_medicine_id is not None:
+        query = query.filter(Schedule.user_medicine_id == user_medicine_id)
+    if schedule_id is not None:
+        query = query.filter(Schedule.id == schedule_id)
+    schedules = query.order_by(Schedule.user_medicine_id, Schedule.id).all() if start <= end else []
+
+    times, daily = {}, {}
+    if schedules:
+        ids = [s[0] for s in schedules]
+        # 只取这些计划的服药时间点（走 schedule_times 的唯一索引），不对整张表分组
+        for sid, t in (
+            db.session.query(ScheduleTime.schedule_id, ScheduleTime.time_of_day)
+            .filter(ScheduleTime.schedule_id.in_(ids))
+        ):
+            times.setdefault(sid, []).append(t)
+        rows = (
+            db.session.query(AdherenceDaily.schedule_id, AdherenceDaily.date, AdherenceDaily.planned, AdherenceDaily.taken)
+            .filter(AdherenceDaily.user_id == user_id, AdherenceDaily.date >= start, AdherenceDaily.date <= end,
+                    AdherenceDaily.schedule_id.in_(ids))
+        )
+        daily = {(sid, day): (planned, taken) for sid, day, planned, taken in rows}
+
+    days = {start + timedelta(days=i): [0, 0] for i in range((end - start).days + 1)}
+    per_schedule = []
+    for sid, um_id, s_start, s_end, name in schedules:
+        slots = times.get(sid, [])
+        planned_total = taken_total = 0
+        day = max(start, s_start)
+        while day <= min(end, s_end):
+            planned, taken = daily.get((sid, day), (len(slots), 0))
+            if day == today:
+                planned = max(sum(t <= now.time() for t in slots), taken)
+            days[day][0] += planned
+            days[day][1] += taken
+            planned_total += planned
+            taken_total += taken
+            day += timedelta(days=1)
+        per_schedule.append({
+            'schedule_id': sid,
+            'user_medicine_id': um_id,
+            'medicine_name': name,
+            'planned': planned_total,
+            'taken': taken_total,
+            'rate': _rate(taken_total, planned_total),
+        })
+
+    planned = sum(p for p, _ in days.values())
+    taken = sum(t for _, t in days.values())
+    return {
+        'from': start.isoformat(),
+        'to': end.isoformat(),
+        'planned': planned,
+        'taken': taken,
+        'rate': _rate(taken, planned),
+        'days': [{'date': day.isoformat(), 'planned': p, 'taken': t, 'rate': _rate(t, p)} for day, (p, t) in days.items()],
+        'schedules': per_schedule,
+    }
@@ -0,0 +1,231 @@
+"""异步（ASGI）流式聊天入口。
+
+同步的 /api/chat/deepseek 在整个流式输出期间占用一个 WSGI worker；这里用 AsyncOpenAI 在事件循环中
+转发同一个接口，单个进程即可同时承载数百个 SSE 流。其余路径交给 Flask 应用处理（需要安装 asgiref），
+未安装时只提供聊天接口，可作为独立的 sidecar 部署，由反向代理把 /api/chat/deepseek 路由过来：
+
+    uvicorn asgi:app --port 8001
+"""
+import json
+import time
+import asyncio
+import logging
+from .chat import chat_params, budget_headers, FrameCoalescer, error_frame, DONE_FRAME
+from .llm import LLMBusyError
+from .ratelimit import MemoryBucketStore, retry_seconds
+
+logger = logging.getLogger(__name__)
+
+CHAT_PATH = '/api/chat/deepseek'
+
+SSE_HEADERS = [
+    (b'content-type', b'text/event-stream; charset=utf-8'),
+    (b'cache-control', b'no-cache'),
+    (b'x-accel-buffering', b'no'),
+]
+
+
+async def _read_body(receive):
+    body = b''
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return None
+        body += message.get('body', b'')
+        if not message.get('more_body'):
+            return body
+
+
+async def _send_json(send, status, payload):
+    body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+    await send({'type': 'http.response.start', 'status': status,
+                'headers': [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode())]})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+def _header(scope, name):
+    """同名请求头出现多次时按顺序用逗号连接（与 WSGI 服务器的处理一致），X-Forwarded-For 由此保持从左到右的顺序"""
+    values = [value.decode('latin-1') for key, value in scope.get('headers', ()) if key == name]
+    return ', '.join(values) if values else None
+
+
+async def _wait_disconnect(receive):
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return
+
+
+async def _coalesced(stream, coalescer):
+    """逐个产出上游 chunk；缓冲区有文本时最多等待到合并窗口到期，到期仍无新 chunk 则产出 None。
+
+    超时只是不再等待，不取消正在读取的下一个 chunk（取消会中断上游流），下一轮继续等同一个任务。
+    """
+    iterator = stream.__aiter__()
+    pending = None
+    try:
+        while True:
+            if pending is None:
+                pending = asyncio.ensure_future(iterator.__anext__())
+            done, _ = await asyncio.wait({pending}, timeout=coalescer.remaining())
+            if not done:
+                yield None
+                continue
+            task, pending = pending, None
+            try:
+                chunk = task.result()
+            except StopAsyncIteration:
+                return
+            yield chunk
+    finally:
+        if pending is not None:
+            pending.cancel()
+
+
+class ChatStreamApp:
+    """最小的 ASGI 应用：自己处理流式聊天，其余请求转发给 fallback（通常是包装后的 Flask 应用）"""
+
+    def __init__(self, flask_app, fallback=None):
+        self.flask_app = flask_app
+        self.fallback = fallback
+        self.llm = flask_app.extensions['llm']
+        self.metrics = flask_app.extensions['metrics']
+        self.ratelimiter = flask_app.extensions['ratelimit']
+        self.max_concurrency = flask_app.config.get('LLM_ASYNC_MAX_CONCURRENCY', 256)
+        self.coalesce_ms = flask_app.config.get('CHAT_COALESCE_MS', 30)
+        self.coalesce_bytes = flask_app.config.get('CHAT_COALESCE_BYTES', 256)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            while True:
+                message = await receive()
+                if message['type'] == 'lifespan.startup':
+                    await send({'type': 'lifespan.startup.complete'})
+                elif message['type'] == 'lifespan.shutdown':
+                    await send({'type': 'lifespan.shutdown.complete'})
+                    return
+
+        if scope['type'] == 'http' and scope['path'] == CHAT_PATH and scope['method'] == 'POST':
+            return await self.chat(scope, receive, send)
+        if self.fallback is not None:
+            return await self.fallback(scope, receive, send)
+        if scope['type'] == 'http':
+            await _send_json(send, 404, {'error': 'Not Found'})
+
+    async def chat(self, scope, receive, send):
+        allowed, retry_after = await self._rate_limit(scope)
+        if not allowed:
+            return await self._too_many_requests(send, retry_after)
+        if not self.llm.available:
+            return await _send_json(send, 500, {'error': 'DeepSeek API Key not configured'})
+
+        body = await _read_body(receive)
+        if body is None:
+            return
+        try:
+            final_messages, model, temperature, budget = chat_params(json.loads(body or b'{}'), self.flask_app.config)
+        except (ValueError, AttributeError) as e:
+            return await _send_json(send, 400, {'error': f'Invalid request body: {e}'})
+
+        try:
+            async with self.llm.async_slot(self.max_concurrency):
+                # 请求体已读完，之后 receive() 只会等到断开事件；客户端断开时取消上游流，及时归还名额
+                stream_task = asyncio.ensure_future(self._stream(send, final_messages, model, temperature, budget))
+                watcher = asyncio.ensure_future(_wait_disconnect(receive))
+                done, _ = await asyncio.wait({stream_task, watcher}, return_when=asyncio.FIRST_COMPLETED)
+                if stream_task in done:
+                    watcher.cancel()
+                    stream_task.result()
+                else:
+                    stream_task.cancel()
+        except LLMBusyError:
+            await _send_json(send, 503, {'error': 'AI service is busy, please retry later'})
+
+    def _session_user(self, scope):
+        """解出 Flask 会话 Cookie 中的 user_id，与同步接口按同一个用户计数"""
+        cookie = _header(scope, b'cookie')
+        if not cookie:
+            return None
+        from http.cookies import SimpleCookie
+        morsel = SimpleCookie(cookie).get(self.flask_app.config.get('SESSION_COOKIE_NAME', 'session'))
+        if morsel is None:
+            return None
+        serializer = self.flask_app.session_interface.get_signing_serializer(self.flask_app)
+        try:
+            return serializer.loads(morsel.value).get('user_id')
+        except Exception:
+            return None
+
+    async def _rate_limit(self, scope):
+        client = self.ratelimiter.client_key(
+            self._session_user(scope), (scope.get('client') or (None,))[0], _header(scope, b'x-forwarded-for'))
+        if isinstance(self.ratelimiter.store, MemoryBucketStore):
+            return self.ratelimiter.hit('chat', client)
+
+        # 数据库存储的桶需要应用上下文，且是阻塞调用，放到线程池执行
+        def hit():
+            with self.flask_app.app_context():
+                return self.ratelimiter.hit('chat', client)
+        return await asyncio.to_thread(hit)
+
+    async def _too_many_requests(self, send, retry_after):
+        seconds = retry_seconds(retry_after)
+        body = json.dumps({'error': 'Too many requests, please retry later', 'retry_after': seconds}).encode('utf-8')
+        await send({'type': 'http.response.start', 'status': 429,
+                    'headers': [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode()),
+                                (b'retry-after', str(seconds).encode())]})
+        await send({'type': 'http.response.body', 'body': body})
+
+    async def _stream(self, send, final_messages, model, temperature, budget):
+        headers = SSE_HEADERS + [(k.lower().encode(), v.encode()) for k, v in budget_headers(budget).items()]
+        await send({'type': 'http.response.start', 'status': 200, 'headers': headers})
+        coalescer = FrameCoalescer(self.coalesce_ms, self.coalesce_bytes)
+        start = time.perf_counter()
+        ttft = None
+        outcome = 'ok'
+        try:
+            stream = await self.llm.async_client.chat.completions.create(
+                model=model,
+                messages=final_messages,
+                stream=True,
+                temperature=temperature,
+                max_tokens=4000
+            )
+            async for chunk in _coalesced(stream, coalescer):
+                if chunk is None:
+                    # 上游停顿，合并窗口已到期：先把缓冲的文本发出去
+                    frames = coalescer.flush()
+                else:
+                    if not chunk.choices:
+                        continue
+                    if ttft is None:
+                        ttft = time.perf_counter() - start
+                    frames = coalescer.push(chunk.choices[0].delta)
+                if frames:
+                    await send({'type': 'http.response.body', 'body': ''.join(frames).encode('utf-8'), 'more_body': True})
+            tail = ''.join(coalescer.flush()) + DONE_FRAME
+        except asyncio.CancelledError:
+            outcome = 'disconnected'
+            raise
+        except Exception as e:
+            outcome = 'error'
+            logger.exception("Async stream error")
+            tail = ''.join(coalescer.flush()) + error_frame(e)
+        finally:
+            self.metrics.observe_llm(model, 'asgi', time.perf_counter() - start, ttft, outcome)
+        await send({'type': 'http.response.body', 'body': tail.encode('utf-8')})
+
+
+def create_asgi_app(flask_app=None):
+    """用 create_app() 构建的 Flask 应用（共享配置与 LLM 客户端）创建 ASGI 应用"""
+    if flask_app is None:
+        from . import create_app
+        flask_app = create_app()
+
+    fallback = None
+    try:
+        from asgiref.wsgi import WsgiToAsgi
+        fallback = WsgiToAsgi(flask_app)
+    except ImportError:
+        pass
+    return ChatStreamApp(flask_app, fallback)
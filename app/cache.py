@@ -0,0 +1,203 @@
+import logging
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from .knowledge import split_phrases
+
+logger = logging.getLogger(__name__)
+
+
+def canonical_symptoms(symptom):
+    """把症状描述规整成与顺序、标点、重复无关的形式："头痛,发热" 与 "发热，头痛" 得到同一个结果"""
+    return ','.join(sorted(set(split_phrases(symptom))))
+
+
+class MemoryStore:
+    """进程内的 LRU + TTL 缓存"""
+
+    def __init__(self, max_size=1024, ttl=3600):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            if item[0] < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return item[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class DatabaseStore:
+    """存放在应用数据库（SQLite / PostgreSQL）中的共享缓存，供多 worker 部署使用"""
+
+    # 每写入这么多次清理一次过期条目和超出容量的旧条目
+    PURGE_EVERY = 100
+
+    def __init__(self, max_size=10000, ttl=3600):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._writes = 0
+
+    def get(self, key):
+        from .extensions import db
+        from .models import ConsultCacheEntry
+        try:
+            entry = db.session.get(ConsultCacheEntry, key)
+            if entry is None or entry.expires_at < datetime.utcnow():
+                return None
+            return json.loads(entry.value)
+        except Exception as e:
+            db.session.rollback()
+            logger.warning("Consult cache read error: %s", e)
+            return None
+
+    def set(self, key, value):
+        from .extensions import db
+        from .models import ConsultCacheEntry
+        try:
+            db.session.merge(ConsultCacheEntry(
+                key=key,
+                value=json.dumps(value, ensure_ascii=False),
+                expires_at=datetime.utcnow() + timedelta(seconds=self.ttl),
+            ))
+            db.session.commit()
+            self._writes += 1
+            if self._writes % self.PURGE_EVERY == 0:
+                self.purge()
+        except Exception as e:
+            db.session.rollback()
+            logger.warning("Consult cache write error: %s", e)
+
+    def purge(self):
+        from .extensions import db
+        from .models import ConsultCacheEntry
+        ConsultCacheEntry.query.filter(ConsultCacheEntry.expires_at < datetime.utcnow()).delete()
+        # 超出容量时删除最早过期的条目
+        overflow = ConsultCacheEntry.query.count() - self.max_size
+        if overflow > 0:
+            oldest = db.session.query(ConsultCacheEntry.key).order_by(ConsultCacheEntry.expires_at).limit(overflow)
+            ConsultCacheEntry.query.filter(ConsultCacheEntry.key.in_(oldest.scalar_subquery())).delete(synchronize_session=False)
+        db.session.commit()
+
+    def clear(self):
+        from .extensions import db
+        from .models import ConsultCacheEntry
+        ConsultCacheEntry.query.delete()
+        db.session.commit()
+
+
+class SingleFlight:
+    """同一进程内相同键的并发调用只执行一次：第一个调用者计算，其余等待并共享它的结果（或异常）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}  # key -> [Event, 结果, 异常]
+        self.coalesced = 0
+
+    def do(self, key, fn, timeout=None):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = [threading.Event(), None, None]
+            else:
+                self.coalesced += 1
+        if not leader:
+            # 等待超时（上游卡住）时不再等，自己计算
+            if call[0].wait(timeout):
+                if call[2] is not None:
+                    raise call[2]
+                return call[1]
+            return fn()
+        try:
+            call[1] = fn()
+            return call[1]
+        except Exception as e:
+            call[2] = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call[0].set()
+
+
+STORES = {
+    'memory': MemoryStore,
+    'database': DatabaseStore,
+}
+
+
+class ConsultCache:
+    """AI 问诊结果缓存，键为规整后的症状集合 + 知识库版本，知识库更新后旧条目自然失效"""
+
+    def __init__(self, app=None):
+        self.store = None
+        self.hits = 0
+        self.misses = 0
+        self.flights = SingleFlight()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        backend = app.config.setdefault('CONSULT_CACHE_BACKEND', 'memory')
+        max_size = app.config.setdefault('CONSULT_CACHE_SIZE', 1024)
+        ttl = app.config.setdefault('CONSULT_CACHE_TTL', 3600)
+        if backend in ('none', '', None):
+            self.store = None
+        elif backend in STORES:
+            self.store = STORES[backend](max_size=max_size, ttl=ttl)
+        else:
+            raise ValueError(f"Unknown CONSULT_CACHE_BACKEND: {backend}")
+        app.extensions['consult_cache'] = self
+
+    @staticmethod
+    def make_key(symptom, kb_version):
+        raw = f"{kb_version}|{canonical_symptoms(symptom)}"
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        if self.store is None:
+            return None
+        value = self.store.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set(self, key, value):
+        if self.store is not None:
+            self.store.set(key, value)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'backend': type(self.store).__name__ if self.store is not None else None,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / total, 4) if total else 0.0,
+            'coalesced': self.flights.coalesced,
+        }
@@ -0,0 +1,113 @@
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+MEDICINE_FIELDS = ('id', 'name', 'generic_name', 'indications', 'dosage', 'contraindications', 'side_effects', 'precautions')
+
+_MISSING = object()
+
+
+def medicine_dict(medicine):
+    """ORM 对象 -> 普通 dict，缓存中不保存与 session 绑定的对象；模板里 med.name 的写法不受影响"""
+    return {field: getattr(medicine, field) for field in MEDICINE_FIELDS}
+
+
+class CatalogCache:
+    """药品目录的读穿缓存。
+
+    药品表只在导入 / 种子数据时写入，其余时间只读。缓存按 catalog_versions 表中的版本号失效：
+    每个 worker 最多每 CATALOG_VERSION_CHECK_INTERVAL 秒查一次版本，其余请求完全不访问数据库。
+    """
+
+    def __init__(self, app=None):
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.version = None
+        self.updated_at = datetime.utcnow()
+        self._checked_at = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config.setdefault('CATALOG_CACHE_ENABLED', True)
+        self.max_size = app.config.setdefault('CATALOG_CACHE_SIZE', 512)
+        self.check_interval = app.config.setdefault('CATALOG_VERSION_CHECK_INTERVAL', 30)
+        app.extensions['catalog_cache'] = self
+
+    def _read_version(self):
+        from .models import CatalogVersion
+        from .extensions import db
+        row = db.session.get(CatalogVersion, 1)
+        return (row.version, row.updated_at) if row else (0, self.updated_at)
+
+    def current_version(self):
+        """返回 (版本号, 更新时间)；版本变化时清空缓存并让药品检索索引重建"""
+        now = time.monotonic()
+        if self.version is None or now - self._checked_at >= self.check_interval:
+            version, updated_at = self._read_version()
+            self._checked_at = now
+            if version != self.version:
+                from .search import invalidate_search_index
+                with self._lock:
+                    self._data.clear()
+                    self.version = version
+                    self.updated_at = updated_at or self.updated_at
+                invalidate_search_index()
+        return self.version, self.updated_at
+
+    def get_or_load(self, key, loader):
+        """命中则直接返回；否则调用 loader() 从数据库加载并缓存（None 也会被缓存，避免反复查询不存在的 id）"""
+        if not self.enabled:
+            return loader()
+        self.current_version()
+        with self._lock:
+            value = self._data.get(key, _MISSING)
+            if value is not _MISSING:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return value
+        self.misses += 1
+        value = loader()
+        with self._lock:
+            self._data[key] = value
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+        return value
+
+    def etag(self, key, *vary):
+        """强 ETag（以 response.set_etag 输出）：目录版本 + 缓存键 + 影响页面内容的其它因素（如登录用户）。
+
+        这些因素相同时渲染出的页面逐字节相同；带 flash 消息的请求不走 304，见 routes.not_modified。
+        """
+        raw = '|'.join(str(part) for part in (self.current_version()[0], key) + vary)
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()[:20]
+
+    def bump(self):
+        """药品数据写入后调用：版本号 +1，本进程立即失效，其它 worker 在下一次版本检查时失效"""
+        from .models import CatalogVersion
+        from .extensions import db
+        row = db.session.get(CatalogVersion, 1)
+        if row is None:
+            row = CatalogVersion(id=1, version=0)
+            db.session.add(row)
+        row.version = (row.version or 0) + 1
+        row.updated_at = datetime.utcnow()
+        db.session.commit()
+        self._checked_at = 0.0
+        self.current_version()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'version': self.version,
+            'entries': len(self._data),
+            'hits': self.hits,
+            'misses': self.misses,
+            'not_modified': self.not_modified,
+            'hit_rate': round(self.hits / total, 4) if total else 0.0,
+        }
@@ -0,0 +1,257 @@
+import re
+import json
+import time
+
+# 默认系统提示词
+DEFAULT_SYSTEM_PROMPT = {
+    "role": "system",
+    "content": """你是"小晴"，一个基于大语言模型的 AI 智能辅助问诊助手。
+
+【你的身份】
+- 你是 AI 智能辅助问诊模型，专门为用户提供健康问题的初步分析和建议
+- 你具备医学知识，但你不是真正的医生，你的建议仅供参考
+
+【你的职责】
+1. **智能分析症状**：根据用户描述的症状，结合医学知识进行初步分析
+2. **提供参考建议**：给出可能的疾病方向、就医建议、日常护理建议
+3. **倾听与共情**：用温暖、专业的语言与用户交流，缓解其焦虑
+4. **安全提醒**：当症状严重或紧急时，明确建议立即就医
+5. **用药指导**：提供用药的一般性建议，但强调需遵医嘱
+
+【回答原则】
+- 回答时要专业但不晦涩，用通俗易懂的语言解释医学概念
+- 对不确定的问题要诚实说明，不要给出模棱两可的答案
+- 每次回答后都要提醒："本建议仅供参考，如症状持续或加重，请及时就医"
+- 保持温和、耐心、友善的语气，像一个关心用户健康的朋友
+
+【回答格式参考】
+当用户描述症状时，你可以这样回答：
+1. 理解和共情："我理解您现在的感受..."
+2. 症状分析："根据您描述的症状..."
+3. 可能原因："这可能是由于..."
+4. 建议措施："建议您..."
+5. 就医指导："如果...情况，建议立即就医"
+6. 免责声明："以上建议仅供参考，请以医生诊断为准"
+
+记住：你是 AI 智能辅助问诊模型，你的目标是提供有价值的健康参考信息，但不能替代专业医疗诊断。"""
+}
+
+DONE_FRAME = "data: [DONE]\n\n"
+
+
+# 中日韩字符与全角标点
+_CJK = re.compile(r'[\u3000-\u303f\u3400-\u9fff\uff00-\uffef]')
+# 每条消息的角色、分隔符等固定开销
+MESSAGE_OVERHEAD = 4
+SUMMARY_PREFIX = "以下是较早对话的摘要（原文已省略）：\n"
+KNOWLEDGE_PREFIX = "参考知识库（与用户最新问题最相关的条目，仅供参考）：\n"
+
+
+def estimate_tokens(text):
+    """粗略估算 token 数：按 DeepSeek 的换算，1 个中文字符约 0.6 token，1 个英文字符约 0.3 token"""
+    if not isinstance(text, str):
+        text = json.dumps(text, ensure_ascii=False)
+    cjk = len(_CJK.findall(text))
+    return int(cjk * 0.6 + (len(text) - cjk) * 0.3) + 1
+
+
+def message_tokens(message):
+    return estimate_tokens(message.get('content') or '') + MESSAGE_OVERHEAD
+
+
+def summarize_turns(messages, max_chars=60):
+    """把较早的轮次压缩成一条系统消息：每轮只保留开头 max_chars 个字符，不额外调用大模型"""
+    lines = []
+    for msg in messages:
+        content = msg.get('content') or ''
+        if not isinstance(content, str):
+            content = json.dumps(content, ensure_ascii=False)
+        content = ' '.join(content.split())
+        if len(content) > max_chars:
+            content = content[:max_chars] + '…'
+        lines.append(f"{'用户' if msg.get('role') == 'user' else '小晴'}：{content}")
+    return {"role": "system", "content": SUMMARY_PREFIX + "\n".join(lines)}
+
+
+def knowledge_message(messages, top_k, min_score):
+    """用最新一条用户消息检索知识库，只注入命中的条目；没有命中或知识库不可用时返回 None"""
+    query = next((m.get('content') for m in reversed(messages) if m.get('role') == 'user'), None)
+    if not query or not isinstance(query, str) or top_k <= 0:
+        return None, 0
+    try:
+        from .knowledge import get_knowledge_base
+        kb = get_knowledge_base()
+    except OSError:
+        return None, 0
+    matches = kb.search(query, top_k=top_k, min_score=min_score)
+    if not matches:
+        return None, 0
+    return {"role": "system", "content": KNOWLEDGE_PREFIX + kb.prompt_for(matches)}, len(matches)
+
+
+def fit_budget(messages, budget, keep_recent=6, summarize=True, extra=()):
+    """在 token 预算内组装上下文，返回 (消息列表, 统计)。
+
+    开头的 system 消息和最近 keep_recent 条消息总是保留（即使超出预算）；更早的消息从新到旧尽量放入，
+    放不下的部分压缩成一条摘要，摘要也放不下时直接丢弃。extra 为要插在 system 消息之后的消息（如知识库条目）。
+    """
+    head = 0
+    while head < len(messages) and messages[head].get('role') == 'system':
+        head += 1
+    system, conversation = messages[:head], messages[head:]
+    recent = conversation[-keep_recent:] if keep_recent > 0 else []
+    older = conversation[:len(conversation) - len(recent)]
+
+    used = sum(message_tokens(m) for m in system + list(extra) + recent)
+    # 放不下全部旧消息时，先为摘要预留五分之一的预算
+    overflow = used + sum(message_tokens(m) for m in older) > budget
+    limit = budget - (budget // 5 if overflow and summarize else 0)
+    kept = []
+    for msg in reversed(older):
+        tokens = message_tokens(msg)
+        if used + tokens > limit:
+            break
+        kept.append(msg)
+        used += tokens
+    kept.reverse()
+    dropped = older[:len(older) - len(kept)]
+
+    summary = []
+    decision = 'none'
+    if dropped:
+        decision = 'dropped'
+        # 摘要仍然放不下时，从最早的轮次开始舍弃
+        for start in range(len(dropped)) if summarize else ():
+            note = summarize_turns(dropped[start:])
+            if used + message_tokens(note) <= budget:
+                summary = [note]
+                used += message_tokens(note)
+                decision = 'summarized'
+                break
+
+    stats = {
+        'tokens_in': sum(message_tokens(m) for m in messages),
+        'tokens_out': used,
+        'budget': budget,
+        'dropped': len(dropped),
+        'decision': decision,
+    }
+    return system + list(extra) + summary + kept + recent, stats
+
+
+def chat_params(data, config=None):
+    """从请求体中取出 (最终消息列表, 模型, 温度, 上下文统计)，同步与异步两条流式路径共用"""
+    config = config or {}
+    messages = data.get('messages', [])
+    model = data.get('model', 'deepseek-chat')
+    temperature = data.get('temperature', 1.3)
+
+    # 检查是否已有 system 消息
+    has_system_message = any(msg.get('role') == 'system' for msg in messages)
+    final_messages = messages if has_system_message else [DEFAULT_SYSTEM_PROMPT] + messages
+
+    knowledge, knowledge_rows = knowledge_message(
+        messages, config.get('CHAT_KB_TOP_K', 3), config.get('CONSULT_MIN_SCORE', 0.2))
+    final_messages, stats = fit_budget(
+        final_messages,
+        budget=config.get('CHAT_TOKEN_BUDGET', 6000),
+        keep_recent=config.get('CHAT_KEEP_RECENT', 6),
+        summarize=config.get('CHAT_SUMMARIZE', True),
+        extra=[knowledge] if knowledge else (),
+    )
+    stats['knowledge_rows'] = knowledge_rows
+    return final_messages, model, temperature, stats
+
+
+def budget_headers(stats):
+    """上下文裁剪情况放进响应头，便于监控每个请求的提示词规模"""
+    return {
+        'X-Prompt-Tokens-Original': str(stats['tokens_in']),
+        'X-Prompt-Tokens': str(stats['tokens_out']),
+        'X-Prompt-Token-Budget': str(stats['budget']),
+        'X-Context-Trim': stats['decision'],
+        'X-Context-Dropped-Messages': str(stats['dropped']),
+        'X-Knowledge-Rows': str(stats['knowledge_rows']),
+    }
+
+
+# 帧的固定部分预先拼好，每帧只对文本本身做一次 json.dumps
+_FRAME_PREFIX = {
+    'reasoning_content': 'data: {"choices": [{"delta": {"reasoning_content": ',
+    'content': 'data: {"choices": [{"delta": {"content": ',
+}
+_FRAME_SUFFIX = '}}]}\n\n'
+
+
+def text_frame(field, text):
+    return _FRAME_PREFIX[field] + json.dumps(text, ensure_ascii=False) + _FRAME_SUFFIX
+
+
+def delta_parts(delta):
+    """取出 delta 中的 (字段, 文本)，DeepSeek R1 的思考过程在前，实际回复内容在后"""
+    reasoning = getattr(delta, 'reasoning_content', None)
+    content = getattr(delta, 'content', None)
+    if reasoning:
+        yield 'reasoning_content', reasoning
+    if content:
+        yield 'content', content
+
+
+class FrameCoalescer:
+    """把连续的 token 合并成一个 SSE 帧再发送。
+
+    思考过程和正式回复各自的第一段文本立即输出，不影响首 token 时间；之后缓冲区里最早的 token
+    已等待 window_ms，或累计超过 max_bytes 时输出。两类内容之间切换、以及流结束时也会立即输出，
+    保证它们不会混在同一帧里。window_ms 为 0 时不合并。
+
+    push() 只在下一个 token 到达时检查窗口；调用方能等待超时（如 ASGI 路径）时，应最多等待
+    remaining() 秒，超时后调用 flush()，避免上游停顿时已收到的文本一直压在缓冲区里。
+    """
+
+    def __init__(self, window_ms=30, max_bytes=256):
+        self.window = window_ms / 1000
+        self.max_bytes = max_bytes
+        self._field = None
+        self._parts = []
+        self._size = 0
+        self._started = 0.0
+        self._seen = set()  # 已输出过首段文本的字段
+
+    def push(self, delta):
+        """送入一个上游 delta，返回此刻需要发送的帧（可能为空列表）"""
+        frames = []
+        for field, text in delta_parts(delta):
+            if self._parts and field != self._field:
+                frames.append(self._take())
+            if not self._parts:
+                self._field = field
+                self._started = time.monotonic()
+            self._parts.append(text)
+            self._size += len(text.encode('utf-8'))
+            if (field not in self._seen or self._size >= self.max_bytes
+                    or time.monotonic() - self._started >= self.window):
+                self._seen.add(field)
+                frames.append(self._take())
+        return frames
+
+    def remaining(self):
+        """缓冲区中最早的 token 距离窗口到期还有多少秒；缓冲区为空时返回 None"""
+        if not self._parts:
+            return None
+        return max(0.0, self._started + self.window - time.monotonic())
+
+    def flush(self):
+        return [self._take()] if self._parts else []
+
+    def _take(self):
+        frame = text_frame(self._field, ''.join(self._parts))
+        self._parts = []
+        self._size = 0
+        return frame
+
+
+def error_frame(e):
+    error_data = {
+        'error': f'{type(e).__name__}: {str(e)}'
+    }
+    return f"data: {json.dumps(error_data, ensure_ascii=False)}\n\n"
@@ -0,0 +1,82 @@
+import click
+from flask.cli import with_appcontext
+
+
+def init_db():
+    """建表；药品表为空时导入种子数据"""
+    from .extensions import db
+    from . import models
+    db.create_all()
+    if not models.Medicine.query.first():
+        from .seed import seed_medicines
+        seed_medicines(db)
+
+
+@click.command('init-db')
+@with_appcontext
+def init_db_command():
+    """建表并在药品表为空时导入种子数据（AUTO_INIT_DB=0 时在部署阶段执行）"""
+    init_db()
+    click.echo('Database initialized.')
+
+
+@click.command('seed')
+@with_appcontext
+def seed_command():
+    """导入种子药品数据"""
+    from .extensions import db
+    from .seed import seed_medicines
+    seed_medicines(db)
+
+
+@click.command('import-medicines')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(['auto', 'txt', 'csv', 'json', 'jsonl']), default='auto',
+              help='源文件格式，默认按扩展名判断')
+@click.option('--batch-size', default=500, show_default=True, help='每批 executemany 的行数')
+@click.option('--prune', is_flag=True, help='删除源文件中不存在且未被用户药箱引用的药品')
+@click.option('--dry-run', is_flag=True, help='只报告差异，不写入')
+@with_appcontext
+def import_medicines_command(path, fmt, batch_size, prune, dry_run):
+    """流式导入药品目录（txt / csv / json），按药品全称 upsert"""
+    from .importer import import_medicines, read_records
+    report = import_medicines(read_records(path, fmt), batch_size=batch_size, prune=prune, dry_run=dry_run)
+    changed = report.pop('changed_names')
+    for key, count in report.items():
+        click.echo(f"{key}: {count}")
+    if changed:
+        click.echo('changed: ' + ', '.join(changed))
+    if dry_run:
+        click.echo('(dry run, nothing written)')
+
+
+@click.command('upgrade-db')
+@with_appcontext
+def upgrade_db_command():
+    """升级已有数据库：补建新表与索引、合并重复药箱条目、转换日期列、拆分服药时间"""
+    from .extensions import db
+    from .migrations import upgrade_schema
+    try:
+        report = upgrade_schema()
+    except RuntimeError as e:
+        db.session.rollback()
+        raise click.ClickException(str(e))
+    for step, count in report.items():
+        click.echo(f"{step}: {count}")
+
+
+@click.command('backfill-adherence')
+@click.option('--batch-size', default=1000, show_default=True, help='每批写入的汇总行数')
+@with_appcontext
+def backfill_adherence_command(batch_size):
+    """由已有服药记录重建依从性日汇总（可重复执行）"""
+    from .adherence import backfill
+    click.echo(f"adherence_daily rows written: {backfill(batch_size=batch_size)}")
+
+
+def register_commands(app):
+    app.cli.add_command(init_db_command)
+    app.cli.add_command(seed_command)
+    app.cli.add_command(import_medicines_command)
+    app.cli.add_command(upgrade_db_command)
+    app.cli.add_command(backfill_adherence_command)
@@ -0,0 +1,114 @@
+import json
+import time
+import logging
+from flask import current_app
+from .knowledge import get_knowledge_base
+from .extensions import consult_cache, llm, metrics
+
+logger = logging.getLogger(__name__)
+
+DISCLAIMER = "本平台内容仅供科普参考，不能替代专业医疗建议。如有不适，请及时就医。"
+
+NO_MATCH = {
+    'disease': '未找到匹配信息',
+    'advice': '未找到匹配信息，建议咨询医生。',
+    'red_flags': '如症状严重或持续加重，请立即就医。',
+    'disclaimer': DISCLAIMER,
+    'source': 'knowledge_base',
+    'score': 0.0,
+}
+
+
+def retrieve(symptom, kb=None):
+    """从知识库中取出与症状最相近、且超过匹配阈值的 top-k 条目"""
+    kb = kb or get_knowledge_base()
+    cfg = current_app.config
+    return kb.search(symptom, top_k=cfg['CONSULT_TOP_K'], min_score=cfg['CONSULT_MIN_SCORE'])
+
+
+def answer_from_match(score, row):
+    """直接用知识库条目作答，不经过大模型"""
+    return {
+        'disease': row['disease'],
+        'advice': row['advice'],
+        'red_flags': row['red_flags'],
+        'disclaimer': DISCLAIMER,
+        'source': 'knowledge_base',
+        'score': round(score, 4),
+    }
+
+
+def ask_llm(symptom, kb, matches):
+    """只把命中的 top-k 条目注入系统提示词，请求 DeepSeek 给出 JSON 格式的回答"""
+    kb_text = kb.prompt_for(matches) if matches else "（知识库中没有与该症状相近的条目，请依据医学常识谨慎回答）"
+    response = llm.chat(
+        model="deepseek-chat",
+        messages=[
+            {"role": "system", "content": f"""
+             你是一个专业的辅助医疗AI助手。请根据用户的症状描述，结合以下的参考知识库，给出可能的疾病推测、医疗建议和警示信号。
+
+             参考知识库：
+             {kb_text}
+
+             请以JSON格式返回结果，包含三个字段：
+             - disease: 可能的疾病名称（如果无法确定，请说明）
+             - advice: 具体的医疗建议（分点列出）
+             - red_flags: 需要立即就医的严重症状警示
+
+             注意：必须在回复末尾添加“{DISCLAIMER}”
+             """},
+            {"role": "user", "content": f"我感觉：{symptom}"}
+        ],
+        response_format={"type": "json_object"}  # DeepSeek supports JSON mode
+    )
+    result = json.loads(response.choices[0].message.content)
+    result['source'] = 'llm'
+    return result
+
+
+def consult(symptom):
+    """问诊主流程，返回 (结果 dict, HTTP 状态码)。
+
+    0. 先查结果缓存（规整后的症状集合 + 知识库版本）；未命中时同一进程内相同键的并发请求合并成一次计算；
+    1. 用 TF-IDF 余弦相似度检索知识库 top-k；
+    2. 最高分达到 CONSULT_DECISIVE_SCORE 时直接用知识库作答；
+    3. 否则把 top-k 条目作为上下文调用大模型；
+    4. 没有配置 API Key 或大模型调用失败时，退回到知识库的最佳匹配。
+    """
+    kb = get_knowledge_base()
+    cache_key = consult_cache.make_key(symptom, kb.version)
+    cached = consult_cache.get(cache_key)
+    if cached is not None:
+        return cached, 200
+
+    def compute():
+        result, status, cacheable = _consult(symptom, kb)
+        if cacheable:
+            consult_cache.set(cache_key, result)
+        return result, status
+
+    # 等待者最多等一个上游超时；领头请求异常时等待者收到同一个异常
+    return consult_cache.flights.do(cache_key, compute, timeout=current_app.config['LLM_TIMEOUT'])
+
+
+def _consult(symptom, kb):
+    """返回 (结果, 状态码, 是否可缓存)；大模型故障时的兜底结果不缓存，避免把临时故障固化下来"""
+    matches = retrieve(symptom, kb)
+
+    if matches and matches[0][0] >= current_app.config['CONSULT_DECISIVE_SCORE']:
+        return answer_from_match(*matches[0]), 200, True
+
+    if not llm.available:
+        return (answer_from_match(*matches[0]) if matches else dict(NO_MATCH)), 200, True
+
+    start = time.perf_counter()
+    try:
+        result = ask_llm(symptom, kb, matches)
+        metrics.observe_llm('deepseek-chat', 'consult', time.perf_counter() - start)
+        return result, 200, True
+    except Exception as e:
+        metrics.observe_llm('deepseek-chat', 'consult', time.perf_counter() - start, outcome='error')
+        logger.warning("AI API error: %s", e)
+        if matches:
+            return answer_from_match(*matches[0]), 200, False
+        return {'error': 'AI service temporarily unavailable'}, 500, False
@@ -0,0 +1,65 @@
+import os
+from urllib.parse import urlsplit, parse_qs
+
+
+def _flag(env, name, default):
+    return env.get(name, default).lower() not in ('0', 'false', 'no', 'off', '')
+
+
+def pool_mode(uri, env=os.environ):
+    """DB_POOL_MODE：queue（进程内连接池）/ null（每次请求新建连接，交给 PgBouncer 等外部连接池）/ auto。
+
+    auto 时，连接串指向 Neon 的 -pooler 主机或带 pgbouncer=true 参数即视为已有外部连接池，使用 null。
+    """
+    mode = env.get('DB_POOL_MODE', 'auto').lower()
+    if mode != 'auto':
+        return mode
+    parts = urlsplit(uri)
+    if '-pooler' in (parts.hostname or '') or parse_qs(parts.query).get('pgbouncer') == ['true']:
+        return 'null'
+    return 'queue'
+
+
+def engine_options(uri, env=os.environ):
+    """根据环境变量生成 SQLALCHEMY_ENGINE_OPTIONS。
+
+    - DB_POOL_PRE_PING（默认开）：取出连接前先探活，避免 Neon 空闲断开后的第一个请求报错；
+    - DB_POOL_RECYCLE（默认 280 秒）：早于 Neon 约 5 分钟的空闲断开回收连接；
+    - DB_POOL_SIZE / DB_MAX_OVERFLOW / DB_POOL_TIMEOUT：queue 模式下的池大小、溢出上限与等待超时；
+    - DB_CONNECT_TIMEOUT（秒）、DB_STATEMENT_TIMEOUT_MS（默认 0 不限制）：仅 PostgreSQL。
+      PgBouncer 事务模式不支持启动参数，此时应在数据库角色上设置 statement_timeout。
+    """
+    options = {'pool_pre_ping': _flag(env, 'DB_POOL_PRE_PING', '1')}
+    is_postgres = uri.startswith('postgresql')
+
+    if pool_mode(uri, env) == 'null':
+        from sqlalchemy.pool import NullPool
+        options['poolclass'] = NullPool
+    elif is_postgres:
+        options.update(
+            pool_size=int(env.get('DB_POOL_SIZE', 5)),
+            max_overflow=int(env.get('DB_MAX_OVERFLOW', 10)),
+            pool_timeout=float(env.get('DB_POOL_TIMEOUT', 30)),
+            pool_recycle=int(env.get('DB_POOL_RECYCLE', 280)),
+        )
+
+    if is_postgres:
+        connect_args = {'connect_timeout': int(env.get('DB_CONNECT_TIMEOUT', 10))}
+        statement_timeout = int(env.get('DB_STATEMENT_TIMEOUT_MS', 0))
+        if statement_timeout:
+            connect_args['options'] = f'-c statement_timeout={statement_timeout}'
+        options['connect_args'] = connect_args
+    return options
+
+
+def dialect_insert(model):
+    """当前数据库方言的 INSERT，以便使用 ON CONFLICT DO NOTHING / DO UPDATE（SQLite 与 PostgreSQL 均支持）"""
+    from .extensions import db
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise RuntimeError(f"Unsupported database dialect: {dialect}")
+    return insert(model)
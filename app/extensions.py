@@ -1,3 +1,13 @@
 from flask_sqlalchemy import SQLAlchemy
+from .cache import ConsultCache
+from .llm import LLMClient
+from .catalog import CatalogCache
+from .metrics import Metrics
+from .ratelimit import RateLimiter
 
 db = SQLAlchemy()
+consult_cache = ConsultCache()
+llm = LLMClient()
+catalog_cache = CatalogCache()
+metrics = Metrics()
+ratelimiter = RateLimiter()
@@ -0,0 +1,177 @@
+"""药品目录导入：流式读取源文件，按药品全称 upsert，分批 executemany 写入。
+
+    flask --app run import-medicines 药品数据.txt
+    flask --app run import-medicines catalog.csv --dry-run
+    flask --app run import-medicines catalog.json --prune
+
+支持三种格式：
+- txt：药品数据.txt 的格式，每个药品以单独一行的 "1." 开头，字段为 "全称：..." 等；
+- csv：表头为模型字段名（name, generic_name, ...）或中文标签（全称, 简称, ...）；
+- json：对象数组，或每行一个对象（JSON Lines），键同 csv。
+
+源文件中没有的列只在新增药品时留空，更新已有药品时保持原值，因此可以只导入部分列（至少要有全称）。
+"""
+import re
+import csv
+import json
+from sqlalchemy import insert, update
+from .extensions import db, catalog_cache
+from .models import Medicine, UserMedicine
+
+# 中文标签 -> 模型字段
+LABELS = {
+    '全称': 'name',
+    '简称': 'generic_name',
+    '适应症': 'indications',
+    '用法用量': 'dosage',
+    '禁忌症': 'contraindications',
+    '副作用': 'side_effects',
+    '注意事项': 'precautions',
+}
+FIELDS = tuple(LABELS.values())
+
+_BLOCK_START = re.compile(r'^\d+\.$')
+_FIELD_LINE = re.compile(r'^(' + '|'.join(LABELS) + r')：(.+)$')
+
+
+def _normalize(raw):
+    """统一成 {字段: 去除首尾空白的字符串}，键可以是字段名或中文标签。
+
+    只保留源记录中出现的字段：缺少的列表示"不提供"，更新已有药品时保持原值，而不是清空。
+    """
+    record = {}
+    for key, value in raw.items():
+        field = LABELS.get(key, key)
+        if field in FIELDS and value is not None:
+            record[field] = str(value).strip()
+    return record
+
+
+def iter_txt_records(path):
+    """逐行读取，遇到 "N." 行即结束上一个药品，内存占用与单个药品大小相关而与文件大小无关"""
+    block = {}
+    with open(path, encoding='utf-8-sig') as f:
+        for line in f:
+            line = line.strip()
+            if _BLOCK_START.match(line):
+                if block:
+                    yield _normalize(block)
+                block = {}
+                continue
+            m = _FIELD_LINE.match(line)
+            # 同一字段出现多次时以第一次为准
+            if m and m.group(1) not in block:
+                block[m.group(1)] = m.group(2)
+    if block:
+        yield _normalize(block)
+
+
+def iter_csv_records(path):
+    with open(path, encoding='utf-8-sig', newline='') as f:
+        for row in csv.DictReader(f):
+            yield _normalize(row)
+
+
+def iter_json_records(path):
+    with open(path, encoding='utf-8-sig') as f:
+        first = f.read(1)
+        while first and first.isspace():
+            first = f.read(1)
+        if first == '[':
+            f.seek(0)
+            for row in json.load(f):
+                yield _normalize(row)
+        else:
+            f.seek(0)
+            for line in f:
+                if line.strip():
+                    yield _normalize(json.loads(line))
+
+
+READERS = {
+    'txt': iter_txt_records,
+    'csv': iter_csv_records,
+    'json': iter_json_records,
+    'jsonl': iter_json_records,
+}
+
+
+def read_records(path, fmt='auto'):
+    if fmt == 'auto':
+        fmt = path.rsplit('.', 1)[-1].lower() if '.' in path else 'txt'
+    if fmt not in READERS:
+        raise ValueError(f"Unsupported format: {fmt}")
+    return READERS[fmt](path)
+
+
+def _batches(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def import_medicines(records, batch_size=500, prune=False, dry_run=False):
+    """按药品全称 upsert，返回差异报告。
+
+    先用一条查询取出现有目录作比对，再把新增 / 变更分批用 executemany 写入，全部在一个事务里完成；
+    dry_run 时只计算差异并回滚。prune 时删除源文件中不存在、且没有被任何用户药箱引用的药品。
+    """
+    existing = {
+        row[1]: (row[0], dict(zip(FIELDS, (value or '' for value in row[1:]))))
+        for row in db.session.query(Medicine.id, *(getattr(Medicine, f) for f in FIELDS))
+    }
+    report = {'added': 0, 'updated': 0, 'unchanged': 0, 'skipped': 0, 'duplicates': 0, 'removed': 0,
+              'kept_in_use': 0, 'changed_names': []}
+    seen = set()
+
+    for batch in _batches(records, batch_size):
+        inserts, updates = [], []
+        for record in batch:
+            name = record.get('name')
+            if not name:
+                report['skipped'] += 1
+                continue
+            if name in seen:
+                report['duplicates'] += 1
+                continue
+            seen.add(name)
+            if name not in existing:
+                inserts.append({field: record.get(field, '') for field in FIELDS})
+                continue
+            # 只比较、只更新源记录中出现的字段
+            changed = {field: value for field, value in record.items() if existing[name][1][field] != value}
+            if changed:
+                updates.append(dict(changed, id=existing[name][0]))
+                if len(report['changed_names']) < 20:
+                    report['changed_names'].append(name)
+            else:
+                report['unchanged'] += 1
+        if inserts:
+            db.session.execute(insert(Medicine), inserts)
+        if updates:
+            db.session.execute(update(Medicine), updates)
+        report['added'] += len(inserts)
+        report['updated'] += len(updates)
+
+    if prune:
+        stale = [mid for name, (mid, _) in existing.items() if name not in seen]
+        referenced = {mid for (mid,) in db.session.query(UserMedicine.medicine_id).distinct()}
+        in_use = [mid for mid in stale if mid in referenced]
+        removable = [mid for mid in stale if mid not in referenced]
+        for batch in _batches(removable, batch_size):
+            Medicine.query.filter(Medicine.id.in_(batch)).delete(synchronize_session=False)
+        report['removed'] = len(removable)
+        report['kept_in_use'] = len(in_use)
+
+    if dry_run:
+        db.session.rollback()
+    else:
+        db.session.commit()
+        if report['added'] or report['updated'] or report['removed']:
+            catalog_cache.bump()
+    return report
@@ -0,0 +1,173 @@
+"""服药打卡：按 (计划, 日期, 时间点) 记录，批量写入并支持幂等重放。
+
+一次请求可以包含多条打卡（一天多次服药、离线后补同步），所有记录在同一个事务里写入：
+- 只接受属于当前用户、当天有效的计划，且时间点必须是计划中的服药时间；
+- 同一时间点重复打卡按唯一索引忽略，每天的记录数不会超过服药次数；
+- 客户端带上 Idempotency-Key 时，重试请求直接返回第一次的结果；
+- 同一事务里更新依从性日汇总（见 adherence.py）和对应服药时间点的状态（见 slots.py）。
+"""
+import json
+from datetime import datetime, date, timedelta
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from .extensions import db
+from .database import dialect_insert
+from .adherence import record_taken
+from .slots import mark_slots_taken
+from .models import UserMedicine, Schedule, ScheduleTime, IntakeLog, IdempotencyKey
+
+# 单次请求最多的打卡条数
+MAX_BATCH = 100
+# 幂等键保留时长
+IDEMPOTENCY_TTL = timedelta(days=1)
+
+
+def _parse_mark(mark, today):
+    """{"schedule_id": 1, "slot": "08:00", "date": "2024-05-01"} -> (schedule_id, time | None, date)；slot / date 可省略"""
+    schedule_id = int(mark['schedule_id'])
+    slot = mark.get('slot')
+    slot = datetime.strptime(slot.strip(), '%H:%M').time() if slot else None
+    day = date.fromisoformat(mark['date']) if mark.get('date') else today
+    return schedule_id, slot, day
+
+
+def record_intakes(user_id, marks, today=None):
+    """批量记录服药，返回 (每条打卡的处理结果, 涉及的计划在对应日期的最新进度)。不提交事务。
+
+    结果 status：recorded 新记录 / duplicate 该时间点已打过卡（含并发请求抢先写入） / complete 当天已全部服用 /
+    not_found 计划不存在或不属于该用户 / invalid 格式、时间点或日期不合法。
+    未指定 slot 时记到当天第一个还没打卡的时间点。
+    """
+    today = today or date.today()
+    parsed = []
+    for mark in marks:
+        try:
+            parsed.append(_parse_mark(mark, today))
+        except (KeyError, TypeError, ValueError, AttributeError):
+            parsed.append(None)
+
+    schedule_ids = {p[0] for p in parsed if p}
+    schedules = {}
+    if schedule_ids:
+        schedules = {
+            s.id: s for s in Schedule.query
+            .join(UserMedicine, Schedule.user_medicine_id == UserMedicine.id)
+            .filter(UserMedicine.user_id == user_id, Schedule.id.in_(schedule_ids))
+        }
+    # 计划的服药时间点，以及已有记录：(计划, 日期) -> [已打卡的时间点集合, 没有时间点的旧记录条数]
+    times, taken = {}, {}
+    if schedules:
+        for schedule_id, t in (
+            db.session.query(ScheduleTime.schedule_id, ScheduleTime.time_of_day)
+            .filter(ScheduleTime.schedule_id.in_(schedules))
+            .order_by(ScheduleTime.schedule_id, ScheduleTime.time_of_day)
+        ):
+            times.setdefault(schedule_id, []).append(t)
+        dates = {p[2].isoformat() for p in parsed if p}
+        for schedule_id, date_str, slot in (
+            db.session.query(IntakeLog.schedule_id, IntakeLog.date_str, IntakeLog.slot_time)
+            .filter(IntakeLog.schedule_id.in_(schedules), IntakeLog.date_str.in_(dates))
+        ):
+            entry = taken.setdefault((schedule_id, date_str), [set(), 0])
+            if slot is None:
+                entry[1] += 1
+            else:
+                entry[0].add(slot)
+
+    results, rows, touched, pending = [], [], [], []
+    now = datetime.utcnow()
+    for mark, p in zip(marks, parsed):
+        result = {'schedule_id': mark.get('schedule_id') if isinstance(mark, dict) else None}
+        results.append(result)
+        if p is None:
+            result['status'] = 'invalid'
+            continue
+        schedule_id, slot, day = p
+        schedule = schedules.get(schedule_id)
+        if schedule is None:
+            result['status'] = 'not_found'
+            continue
+        result['date'] = day.isoformat()
+        slots = times.get(schedule_id, [])
+        if day > today or not (schedule.start_date <= day <= schedule.end_date) or (slot and slot not in slots):
+            result['status'] = 'invalid'
+            continue
+        if (schedule_id, day) not in touched:
+            touched.append((schedule_id, day))
+
+        done, legacy = taken.setdefault((schedule_id, result['date']), [set(), 0])
+        free = [t for t in slots if t not in done]
+        if slot is not None and slot in done:
+            result['status'] = 'duplicate'
+        elif len(free) <= legacy:
+            result['status'] = 'complete'
+        else:
+            slot = slot or free[legacy]
+            done.add(slot)
+            rows.append({'schedule_id': schedule_id, 'date_str': result['date'], 'slot_time': slot, 'taken_at': now})
+            pending.append((result, (schedule_id, result['date'], slot)))
+        if slot is not None:
+            result['slot'] = slot.strftime('%H:%M')
+
+    if rows:
+        # 并发的重复打卡由唯一索引忽略，RETURNING 只返回真正写入的行：
+        # 每条打卡的结果、日汇总的累加和时间点状态都只以这些行为准
+        stmt = dialect_insert(IntakeLog).on_conflict_do_nothing().returning(
+            IntakeLog.schedule_id, IntakeLog.date_str, IntakeLog.slot_time, IntakeLog.taken_at)
+        inserted = db.session.execute(stmt, rows).all()
+        written = {tuple(row[:3]) for row in inserted}
+        for result, key in pending:
+            result['status'] = 'recorded' if key in written else 'duplicate'
+        record_taken(user_id, schedules, [row[:2] for row in inserted], {sid: len(t) for sid, t in times.items()})
+        mark_slots_taken(inserted)
+    return results, _progress(touched, times)
+
+
+def _progress(touched, times):
+    """写入后重新统计，得到并发情况下也准确的进度"""
+    if not touched:
+        return []
+    counts = dict(
+        ((schedule_id, date_str), n) for schedule_id, date_str, n in
+        db.session.query(IntakeLog.schedule_id, IntakeLog.date_str, func.count(IntakeLog.id))
+        .filter(IntakeLog.schedule_id.in_({s for s, _ in touched}),
+                IntakeLog.date_str.in_({d.isoformat() for _, d in touched}))
+        .group_by(IntakeLog.schedule_id, IntakeLog.date_str)
+    )
+    progress = []
+    for schedule_id, day in touched:
+        total = len(times.get(schedule_id, []))
+        count = min(counts.get((schedule_id, day.isoformat()), 0), total)
+        progress.append({
+            'schedule_id': schedule_id,
+            'date': day.isoformat(),
+            'taken_count': count,
+            'total_count': total,
+            'status': 'completed' if count >= total else 'pending',
+        })
+    return progress
+
+
+def replay(user_id, key):
+    """同一用户的同一幂等键已处理过时返回当时的响应，否则返回 None"""
+    entry = IdempotencyKey.query.filter_by(user_id=user_id, key=key).first()
+    if entry is None or entry.created_at < datetime.utcnow() - IDEMPOTENCY_TTL:
+        return None
+    return json.loads(entry.response)
+
+
+def commit_with_key(user_id, key, response):
+    """把打卡记录和幂等键放在同一个事务里提交；并发的同键请求先提交者生效，返回最终应答给客户端的响应"""
+    if key:
+        IdempotencyKey.query.filter(IdempotencyKey.user_id == user_id,
+                                    IdempotencyKey.created_at < datetime.utcnow() - IDEMPOTENCY_TTL).delete()
+        db.session.add(IdempotencyKey(user_id=user_id, key=key, response=json.dumps(response, ensure_ascii=False)))
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        previous = replay(user_id, key) if key else None
+        if previous is None:
+            raise
+        return previous
+    return response
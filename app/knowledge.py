@@ -0,0 +1,171 @@
+import logging
+import os
+import re
+import csv
+import math
+import heapq
+import hashlib
+import threading
+
+logger = logging.getLogger(__name__)
+
+KNOWLEDGE_CSV = os.path.join(os.path.dirname(__file__), '../data/symptom_knowledge.csv')
+
+# 症状描述中的分隔符（中英文标点、空白）
+_SEPARATORS = re.compile(r'[\s,，、;；。.:：/|()（）]+')
+
+
+def split_phrases(text):
+    """按标点把症状描述切成短语，例如 "头痛,发热" -> ['头痛', '发热']"""
+    return [p for p in _SEPARATORS.split(str(text or '').lower()) if p]
+
+
+def char_ngrams(text, ngram_range=(1, 2)):
+    """在每个短语内部生成字符 n-gram，不跨越标点"""
+    lo, hi = ngram_range
+    grams = []
+    for phrase in split_phrases(text):
+        for n in range(lo, hi + 1):
+            for i in range(len(phrase) - n + 1):
+                grams.append(phrase[i:i + n])
+    return grams
+
+
+class TfidfIndex:
+    """字符 n-gram 的 TF-IDF 向量化器 + 稀疏矩阵（每行一个 {term_id: weight}，已 L2 归一化）"""
+
+    def __init__(self, documents, ngram_range=(1, 2)):
+        self.ngram_range = ngram_range
+        self.vocabulary = {}
+        doc_freq = []
+        counts = []
+        for doc in documents:
+            tf = {}
+            for gram in char_ngrams(doc, ngram_range):
+                term_id = self.vocabulary.get(gram)
+                if term_id is None:
+                    term_id = self.vocabulary[gram] = len(doc_freq)
+                    doc_freq.append(0)
+                tf[term_id] = tf.get(term_id, 0) + 1
+            for term_id in tf:
+                doc_freq[term_id] += 1
+            counts.append(tf)
+
+        # 与 scikit-learn 默认一致的平滑 idf
+        n_docs = len(counts)
+        self.idf = [math.log((1 + n_docs) / (1 + df)) + 1 for df in doc_freq]
+        self.matrix = [self._weigh(tf) for tf in counts]
+
+        # 按列存放的倒排表（CSC 形式）：term_id -> [(row, weight), ...]
+        # 打分时只遍历查询中出现的列，复杂度与命中的非零元素数成正比，而不是与行数成正比
+        self.postings = [[] for _ in doc_freq]
+        for row_id, row in enumerate(self.matrix):
+            for term_id, weight in row.items():
+                self.postings[term_id].append((row_id, weight))
+
+    def _weigh(self, tf):
+        row = {term_id: count * self.idf[term_id] for term_id, count in tf.items()}
+        norm = math.sqrt(sum(w * w for w in row.values()))
+        if norm:
+            row = {term_id: w / norm for term_id, w in row.items()}
+        return row
+
+    def transform(self, text):
+        """把任意文本映射到同一向量空间，词表外的 n-gram 直接忽略"""
+        tf = {}
+        for gram in char_ngrams(text, self.ngram_range):
+            term_id = self.vocabulary.get(gram)
+            if term_id is not None:
+                tf[term_id] = tf.get(term_id, 0) + 1
+        return self._weigh(tf)
+
+    def score(self, text):
+        """一次性计算查询与所有行的余弦相似度（行向量均已归一化，点积即余弦），返回 {row: score}"""
+        scores = {}
+        for term_id, q_weight in self.transform(text).items():
+            for row_id, weight in self.postings[term_id]:
+                scores[row_id] = scores.get(row_id, 0.0) + q_weight * weight
+        return scores
+
+    def top_k(self, text, k=3, min_score=0.0):
+        """返回相似度最高且不低于 min_score 的 k 个 (row, score)"""
+        scores = self.score(text)
+        best = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+        return [(row_id, score) for row_id, score in best if score >= min_score]
+
+
+class KnowledgeBase:
+    """一次性加载的症状知识库：原始行、预渲染的提示词文本以及 TF-IDF 矩阵"""
+
+    def __init__(self, rows, version):
+        self.rows = rows
+        self.version = version
+        self.prompt_text = "\n".join(format_row(row) for row in rows)
+        self.index = TfidfIndex([row.get('symptom_text', '') for row in rows])
+
+    def __len__(self):
+        return len(self.rows)
+
+    def search(self, text, top_k=3, min_score=0.0):
+        """检索与症状描述最相近的知识条目，返回按相似度降序的 [(score, row), ...]"""
+        return [(score, self.rows[row_id]) for row_id, score in self.index.top_k(text, top_k, min_score)]
+
+    def prompt_for(self, matches):
+        """只把命中的条目渲染成提示词上下文"""
+        return "\n".join(format_row(row) for _, row in matches)
+
+
+def format_row(row):
+    return f"- 症状: {row['symptom_text']} -> 可能疾病: {row['disease']}, 建议: {row['advice']}, 警示: {row['red_flags']}"
+
+
+def _read_rows(path):
+    # 标准库 csv 足够解析这份知识库，不必为此在冷启动时导入 pandas
+    with open(path, encoding='utf-8-sig', newline='') as f:
+        return [{key: (value or '').strip() for key, value in row.items()} for row in csv.DictReader(f)]
+
+
+_lock = threading.Lock()
+_cache = {}  # path -> (mtime_ns, size, KnowledgeBase)
+
+
+def get_knowledge_base(path=KNOWLEDGE_CSV):
+    """返回进程内共享的知识库对象。
+
+    首次调用时才加载；之后每次只做一次 os.stat，文件 mtime/大小变化时再比对内容哈希，
+    哈希不同才重新解析 CSV 并重建向量矩阵。
+    """
+    path = os.path.abspath(path)
+    try:
+        stat = os.stat(path)
+    except OSError as e:
+        logger.error("Error loading knowledge base: %s", e)
+        return KnowledgeBase([], version='missing')
+
+    cached = _cache.get(path)
+    if cached and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+        return cached[2]
+
+    with _lock:
+        cached = _cache.get(path)
+        if cached and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+            return cached[2]
+
+        with open(path, 'rb') as f:
+            version = hashlib.sha1(f.read()).hexdigest()[:12]
+
+        if cached and cached[2].version == version:
+            kb = cached[2]
+        else:
+            try:
+                kb = KnowledgeBase(_read_rows(path), version=version)
+            except Exception as e:
+                logger.error("Error loading knowledge base: %s", e)
+                if cached:
+                    return cached[2]
+                kb = KnowledgeBase([], version='error')
+                # 解析失败不缓存，下次请求再试
+                return kb
+
+        _cache[path] = (stat.st_mtime_ns, stat.st_size, kb)
+        return kb
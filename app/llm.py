@@ -0,0 +1,110 @@
+import asyncio
+import threading
+from contextlib import contextmanager, asynccontextmanager
+
+
+class LLMBusyError(Exception):
+    """同时在途的上游请求已达上限，且在排队超时前没有空出名额"""
+
+
+class LLMClient:
+    """应用级共享的 DeepSeek（OpenAI 兼容）客户端。
+
+    - 整个进程复用同一个 OpenAI 客户端，底层 HTTP 连接池保持长连接，避免每个请求重新握手 TLS；
+    - 连接 / 读取超时与重试次数可配置，重试由 openai SDK 以指数退避执行；
+    - 用信号量限制同时在途的上游请求数，上游变慢时多余的请求快速失败，而不是占满所有 WSGI worker。
+    """
+
+    def __init__(self, app=None):
+        self._client = None
+        self._client_lock = threading.Lock()
+        self._semaphore = None
+        self._async_client = None
+        self._async_semaphore = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.api_key = app.config.get('DEEPSEEK_API_KEY')
+        self.base_url = app.config.get('DEEPSEEK_BASE_URL', 'https://api.deepseek.com')
+        self.timeout = app.config.setdefault('LLM_TIMEOUT', 60.0)
+        self.connect_timeout = app.config.setdefault('LLM_CONNECT_TIMEOUT', 5.0)
+        self.max_retries = app.config.setdefault('LLM_MAX_RETRIES', 2)
+        self.max_concurrency = app.config.setdefault('LLM_MAX_CONCURRENCY', 8)
+        self.queue_timeout = app.config.setdefault('LLM_QUEUE_TIMEOUT', 2.0)
+        self._client = None
+        self._semaphore = threading.BoundedSemaphore(self.max_concurrency)
+        self._async_client = None
+        self._async_semaphore = None
+        app.extensions['llm'] = self
+
+    @property
+    def available(self):
+        return bool(self.api_key)
+
+    @property
+    def client(self):
+        """首次使用时才创建客户端，之后所有请求共用"""
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    # openai 的导入耗时接近一秒，推迟到第一次真正调用上游时，避免拖慢冷启动
+                    from openai import OpenAI, Timeout
+                    self._client = OpenAI(
+                        api_key=self.api_key,
+                        base_url=self.base_url,
+                        timeout=Timeout(self.timeout, connect=self.connect_timeout),
+                        max_retries=self.max_retries,
+                    )
+        return self._client
+
+    @property
+    def async_client(self):
+        """异步客户端，供 ASGI 流式聊天使用；必须在事件循环内首次访问"""
+        if self._async_client is None:
+            from openai import AsyncOpenAI, Timeout
+            self._async_client = AsyncOpenAI(
+                api_key=self.api_key,
+                base_url=self.base_url,
+                timeout=Timeout(self.timeout, connect=self.connect_timeout),
+                max_retries=self.max_retries,
+            )
+        return self._async_client
+
+    def acquire(self):
+        """占用一个上游并发名额，返回可重复调用的释放函数；排队超时则抛出 LLMBusyError"""
+        if not self._semaphore.acquire(timeout=self.queue_timeout):
+            raise LLMBusyError('Too many concurrent upstream requests')
+        once = threading.Lock()
+
+        def release():
+            if once.acquire(blocking=False):
+                self._semaphore.release()
+        return release
+
+    @contextmanager
+    def slot(self):
+        release = self.acquire()
+        try:
+            yield
+        finally:
+            release()
+
+    def chat(self, **kwargs):
+        """非流式调用，占用名额直到响应返回"""
+        with self.slot():
+            return self.client.chat.completions.create(**kwargs)
+
+    @asynccontextmanager
+    async def async_slot(self, limit=None):
+        """异步版本的并发名额；异步路径一个 worker 可承载的流远多于线程数，因此上限单独配置"""
+        if self._async_semaphore is None:
+            self._async_semaphore = asyncio.Semaphore(limit or self.max_concurrency)
+        try:
+            await asyncio.wait_for(self._async_semaphore.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            raise LLMBusyError('Too many concurrent upstream requests')
+        try:
+            yield
+        finally:
+            self._async_semaphore.release()
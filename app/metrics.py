@@ -0,0 +1,220 @@
+"""请求级指标：路由延迟、每个请求的数据库查询次数与耗时、大模型首 token 与流式总时长、缓存命中率。
+
+以 Prometheus 文本格式暴露在 /metrics（METRICS_ENABLED=0 时不注册任何钩子）。除调试模式外，
+抓取必须带 METRICS_TOKEN；未配置令牌时 /metrics 一律返回 403。指标保存在进程内，
+多 worker 部署时每个 worker 各自统计，由抓取端按实例汇总。调试模式或 METRICS_SERVER_TIMING=1 时
+每个响应还带有 Server-Timing 头，浏览器开发者工具里即可看到该请求的数据库查询次数和耗时，便于发现 N+1 回归。
+"""
+import hmac
+import time
+import logging
+import threading
+from flask import Response, current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+LLM_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 16.0, 32.0, 64.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in pairs) + '}'
+
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, '') for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f'{self.name}{_labels(self.labels, key)} {value}')
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help, buckets, labels=()):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        self.labels = labels
+        self._values = {}  # 标签值 -> [各桶计数..., 总和, 次数]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, '') for name in self.labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[i] += 1
+            entry[-2] += value
+            entry[-1] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            for key, entry in sorted(self._values.items()):
+                for bound, count in zip(self.buckets, entry):
+                    lines.append(f'{self.name}_bucket{_labels(self.labels, key, [("le", bound)])} {count}')
+                lines.append(f'{self.name}_bucket{_labels(self.labels, key, [("le", "+Inf")])} {entry[-1]}')
+                lines.append(f'{self.name}_sum{_labels(self.labels, key)} {round(entry[-2], 6)}')
+                lines.append(f'{self.name}_count{_labels(self.labels, key)} {entry[-1]}')
+        return lines
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and 'metrics_start' in g:
+        g.metrics_query_start = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and 'metrics_query_start' in g:
+        g.metrics_db_time += time.perf_counter() - g.pop('metrics_query_start')
+        g.metrics_db_queries += 1
+
+
+class Metrics:
+    """指标收集扩展，与 ConsultCache / CatalogCache 一样通过 init_app 挂到应用上"""
+
+    _engine_hooked = False
+
+    def __init__(self, app=None):
+        self.enabled = False
+        self.request_latency = Histogram(
+            'mediguide_http_request_duration_seconds', 'Time until the response headers are ready',
+            LATENCY_BUCKETS, ('route', 'method', 'status'))
+        self.db_queries = Histogram(
+            'mediguide_db_queries_per_request', 'SQL statements executed per request',
+            QUERY_COUNT_BUCKETS, ('route',))
+        self.db_time = Histogram(
+            'mediguide_db_time_per_request_seconds', 'Total SQL execution time per request',
+            LATENCY_BUCKETS, ('route',))
+        self.llm_ttft = Histogram(
+            'mediguide_llm_time_to_first_token_seconds', 'Upstream LLM time to first streamed token',
+            LLM_BUCKETS, ('model', 'path'))
+        self.llm_duration = Histogram(
+            'mediguide_llm_request_duration_seconds', 'Upstream LLM call or stream duration',
+            LLM_BUCKETS, ('model', 'path'))
+        self.llm_requests = Counter(
+            'mediguide_llm_requests_total', 'Upstream LLM calls by outcome', ('model', 'path', 'outcome'))
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config.setdefault('METRICS_ENABLED', True)
+        app.config.setdefault('METRICS_TOKEN', None)
+        app.config.setdefault('METRICS_SERVER_TIMING', False)
+        app.extensions['metrics'] = self
+        if not self.enabled:
+            return
+        if not app.config['METRICS_TOKEN']:
+            logger.warning("METRICS_TOKEN is not set; /metrics is only served in debug mode.")
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.add_url_rule('/metrics', 'metrics', self.view)
+        if not Metrics._engine_hooked:
+            # 挂在 Engine 类上，对所有应用的连接生效；只在请求上下文里计数
+            event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+            Metrics._engine_hooked = True
+
+    def _before_request(self):
+        g.metrics_start = time.perf_counter()
+        g.metrics_db_queries = 0
+        g.metrics_db_time = 0.0
+
+    def _after_request(self, response):
+        start = g.get('metrics_start')
+        if start is None:
+            return response
+        elapsed = time.perf_counter() - start
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        self.request_latency.observe(elapsed, route=route, method=request.method, status=response.status_code)
+        self.db_queries.observe(g.metrics_db_queries, route=route)
+        self.db_time.observe(g.metrics_db_time, route=route)
+        if current_app.debug or current_app.config['METRICS_SERVER_TIMING']:
+            response.headers['Server-Timing'] = (
+                f'db;dur={g.metrics_db_time * 1000:.1f};desc="{g.metrics_db_queries} queries", '
+                f'app;dur={elapsed * 1000:.1f}'
+            )
+        return response
+
+    def observe_llm(self, model, path, duration, ttft=None, outcome='ok'):
+        """记录一次上游调用；流式调用另外记录首 token 时间"""
+        if not self.enabled:
+            return
+        self.llm_requests.inc(model=model, path=path, outcome=outcome)
+        self.llm_duration.observe(duration, model=model, path=path)
+        if ttft is not None:
+            self.llm_ttft.observe(ttft, model=model, path=path)
+
+    def _cache_lines(self):
+        lines = [
+            '# HELP mediguide_cache_hits_total Cache hits', '# TYPE mediguide_cache_hits_total counter',
+            '# HELP mediguide_cache_misses_total Cache misses', '# TYPE mediguide_cache_misses_total counter',
+            '# HELP mediguide_cache_hit_ratio Cache hit ratio since process start', '# TYPE mediguide_cache_hit_ratio gauge',
+            '# HELP mediguide_cache_coalesced_total Misses that waited for an identical in-flight computation',
+            '# TYPE mediguide_cache_coalesced_total counter',
+        ]
+        for name in ('consult_cache', 'catalog_cache'):
+            cache = current_app.extensions.get(name)
+            if cache is None:
+                continue
+            stats = cache.stats()
+            label = _labels(('cache',), (name.replace('_cache', ''),))
+            lines.append(f"mediguide_cache_hits_total{label} {stats['hits']}")
+            lines.append(f"mediguide_cache_misses_total{label} {stats['misses']}")
+            lines.append(f"mediguide_cache_hit_ratio{label} {stats['hit_rate']}")
+            if 'coalesced' in stats:
+                lines.append(f"mediguide_cache_coalesced_total{label} {stats['coalesced']}")
+        return lines
+
+    def render(self):
+        lines = []
+        for metric in (self.request_latency, self.db_queries, self.db_time,
+                       self.llm_ttft, self.llm_duration, self.llm_requests):
+            lines.extend(metric.render())
+        lines.extend(self._cache_lines())
+        limiter = current_app.extensions.get('ratelimit')
+        if limiter is not None:
+            lines += ['# HELP mediguide_rate_limited_total Requests rejected by the rate limiter',
+                      '# TYPE mediguide_rate_limited_total counter',
+                      f'mediguide_rate_limited_total {limiter.rejected}']
+        return '\n'.join(lines) + '\n'
+
+    def check_token(self):
+        """校验抓取令牌：通过时返回 None，否则返回错误响应；未配置令牌时只在调试模式下放行"""
+        token = current_app.config.get('METRICS_TOKEN')
+        if not token:
+            if current_app.debug:
+                return None
+            return Response('METRICS_TOKEN is not configured\n', status=403, mimetype='text/plain')
+        if not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+            return Response('Unauthorized\n', status=401, mimetype='text/plain')
+        return None
+
+    def view(self):
+        return self.check_token() or Response(self.render(), mimetype='text/plain; version=0.0.4')
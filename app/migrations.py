@@ -0,0 +1,196 @@
+"""已有数据库（SQLite / PostgreSQL）的结构升级。
+
+项目没有引入 Alembic，这里的每一步都是幂等的，可以对同一个库重复执行：
+
+    flask --app run upgrade-db
+"""
+import logging
+from sqlalchemy import func, inspect, text
+from .extensions import db
+from .models import UserMedicine, Schedule, ScheduleTime
+from .services import parse_times
+
+logger = logging.getLogger(__name__)
+
+
+def upgrade_schema():
+    """依次执行所有升级步骤，返回每一步的处理数量"""
+    report = {}
+    db.create_all()  # 新增的表（如 schedule_times）
+    report['merged_user_medicines'] = _merge_duplicate_user_medicines()
+    report['filled_schedule_dates'] = _repair_schedule_dates()  # 必须在任何按 ORM 读取 Schedule 的步骤之前
+    report['converted_date_columns'] = _convert_schedule_dates()
+    report['added_columns'] = _add_missing_columns()
+    report['created_indexes'] = _create_missing_indexes()
+    report['backfilled_schedules'] = _backfill_schedule_times()
+    db.session.commit()
+    report['trigram_indexes'] = _create_trigram_indexes()
+    return report
+
+
+def _merge_duplicate_user_medicines():
+    """同一用户重复加入的药品合并到 id 最小的一条，计划随之迁移，之后才能建唯一索引"""
+    dupes = (
+        db.session.query(UserMedicine.user_id, UserMedicine.medicine_id, func.min(UserMedicine.id))
+        .group_by(UserMedicine.user_id, UserMedicine.medicine_id)
+        .having(func.count(UserMedicine.id) > 1)
+        .all()
+    )
+    merged = 0
+    for user_id, medicine_id, keep_id in dupes:
+        others = [row.id for row in UserMedicine.query.filter(
+            UserMedicine.user_id == user_id,
+            UserMedicine.medicine_id == medicine_id,
+            UserMedicine.id != keep_id,
+        )]
+        Schedule.query.filter(Schedule.user_medicine_id.in_(others)).update(
+            {Schedule.user_medicine_id: keep_id}, synchronize_session=False)
+        UserMedicine.query.filter(UserMedicine.id.in_(others)).delete(synchronize_session=False)
+        merged += len(others)
+    db.session.flush()
+    return merged
+
+
+def _text_date_columns():
+    """仍以文本存储的起止日期列：SQLite 始终如此（Date 以 "YYYY-MM-DD" 文本存储），PostgreSQL 在转换为 DATE 之前"""
+    if db.engine.dialect.name != 'postgresql':
+        return ['start_date', 'end_date']
+    columns = {c['name']: c['type'] for c in inspect(db.engine).get_columns('schedules')}
+    return [name for name in ('start_date', 'end_date') if columns[name].__class__.__name__.upper() != 'DATE']
+
+
+def _repair_schedule_dates():
+    """旧数据中的起止日期先补齐空值、去掉首尾空白，再检查格式，之后才能按 Date 读取或转换列类型。
+
+    两列都是 NOT NULL，但早期版本允许写入空字符串；ORM 读到 '' 会抛 ValueError，PostgreSQL 的 ALTER 也会半途失败。
+    补齐后仍不是 YYYY-MM-DD 的值直接报错并列出计划 id，由人工修正后重新执行。
+    """
+    pending = _text_date_columns()
+    if not pending:
+        return 0
+    filled = _fill_empty_schedule_dates(pending)
+    for name in pending:
+        db.session.execute(text(f"UPDATE schedules SET {name} = TRIM({name}) WHERE {name} <> TRIM({name})"))
+        if db.engine.dialect.name == 'postgresql':
+            invalid = f"{name} !~ '^[0-9]{{4}}-[0-9]{{1,2}}-[0-9]{{1,2}}$'"
+        else:
+            # date() 会把 2024-02-30 之类的值规整成别的日期，与原值不同即视为无效
+            invalid = f"date({name}) IS NOT {name}"
+        bad = db.session.execute(text(f"SELECT id FROM schedules WHERE {invalid} ORDER BY id LIMIT 20")).scalars().all()
+        if bad:
+            raise RuntimeError(
+                f"schedules.{name} has values that are not YYYY-MM-DD dates (schedule ids: {bad}); "
+                "fix them and run upgrade-db again")
+    return filled
+
+
+def _fill_empty_schedule_dates(pending):
+    """空的开始日期取加入药箱的日期（没有则取今天），空的结束日期取开始日期，返回补齐的数量"""
+    if db.engine.dialect.name == 'postgresql':
+        added_date, today = "to_char(added_at, 'YYYY-MM-DD')", "to_char(CURRENT_DATE, 'YYYY-MM-DD')"
+    else:
+        added_date, today = "date(added_at)", "date('now')"
+    total = 0
+    if 'start_date' in pending:
+        filled = db.session.execute(text(
+            f"UPDATE schedules SET start_date = COALESCE("
+            f" (SELECT {added_date} FROM user_medicines WHERE user_medicines.id = schedules.user_medicine_id),"
+            f" {today})"
+            " WHERE start_date IS NULL OR TRIM(start_date) = ''")).rowcount
+        if filled:
+            logger.warning("Filled %d empty schedules.start_date values from user_medicines.added_at.", filled)
+        total += filled
+    if 'end_date' in pending:
+        filled = db.session.execute(text(
+            "UPDATE schedules SET end_date = TRIM(CAST(start_date AS TEXT))"
+            " WHERE end_date IS NULL OR TRIM(end_date) = ''")).rowcount
+        if filled:
+            logger.warning("Filled %d empty schedules.end_date values with start_date.", filled)
+        total += filled
+    return total
+
+
+def _convert_schedule_dates():
+    """PostgreSQL 中把 VARCHAR(10) 的起止日期改为 DATE；SQLite 没有独立的日期类型，无需转换。
+
+    在 _repair_schedule_dates 之后执行，此时剩下的值都能转换。
+    """
+    if db.engine.dialect.name != 'postgresql':
+        return 0
+    pending = _text_date_columns()
+    for name in pending:
+        db.session.execute(text(f"ALTER TABLE schedules ALTER COLUMN {name} TYPE DATE USING TRIM({name})::date"))
+    return len(pending)
+
+
+def _add_missing_columns():
+    """旧表上补加模型中新增的可空列（如 intake_logs.slot_time）；ALTER TABLE ADD COLUMN 在两种数据库上都无需重写表"""
+    inspector = inspect(db.engine)
+    added = 0
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {c['name'] for c in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            if not column.nullable:
+                logger.warning("Cannot add NOT NULL column %s.%s automatically, skipped.", table.name, column.name)
+                continue
+            column_type = column.type.compile(dialect=db.engine.dialect)
+            db.session.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+            added += 1
+    return added
+
+
+def _create_missing_indexes():
+    """补建模型中声明、但旧表上还没有的索引"""
+    db.session.commit()  # 索引在独立连接上创建，先提交前面的数据修正
+    existing = set()
+    inspector = inspect(db.engine)
+    for table in db.metadata.sorted_tables:
+        if inspector.has_table(table.name):
+            existing.update(ix['name'] for ix in inspector.get_indexes(table.name))
+    created = 0
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(bind=db.engine)
+                created += 1
+    return created
+
+
+def _backfill_schedule_times():
+    """把旧计划中逗号分隔的 time_of_day 拆成 schedule_times 子表"""
+    pending = (
+        Schedule.query
+        .outerjoin(ScheduleTime, ScheduleTime.schedule_id == Schedule.id)
+        .filter(ScheduleTime.id.is_(None))
+        .all()
+    )
+    filled = 0
+    for schedule in pending:
+        try:
+            schedule.set_times(parse_times(schedule.time_of_day or ''))
+            filled += 1
+        except ValueError:
+            logger.warning("Schedule %s has unparseable time_of_day %r, skipped.", schedule.id, schedule.time_of_day)
+    db.session.flush()
+    return filled
+
+
+def _create_trigram_indexes():
+    """PostgreSQL：为药品检索的 ILIKE '%关键词%' 建 pg_trgm GIN 索引；没有扩展权限时跳过，检索仍可用，只是全表扫描"""
+    if db.engine.dialect.name != 'postgresql':
+        return 0
+    try:
+        db.session.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        for column in ('name', 'generic_name', 'indications'):
+            db.session.execute(text(
+                f"CREATE INDEX IF NOT EXISTS ix_medicines_{column}_trgm ON medicines USING gin ({column} gin_trgm_ops)"))
+        db.session.commit()
+        return 3
+    except Exception as e:
+        db.session.rollback()
+        logger.warning("Could not create pg_trgm indexes: %s", e)
+        return 0
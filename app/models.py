@@ -5,7 +5,7 @@ from werkzeug.security import generate_password_hash, check_password_hash
 class User(db.Model):
     __tablename__ = 'users'
     id = db.Column(db.Integer, primary_key=True)
-    nickname = db.Column(db.String(80), nullable=False)
+    nickname = db.Column(db.String(80), nullable=False, index=True)
     password_hash = db.Column(db.String(256), nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
@@ -23,7 +23,7 @@ class User(db.Model):
 class Medicine(db.Model):
     __tablename__ = 'medicines'
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(100), nullable=False)
+    name = db.Column(db.String(100), nullable=False, index=True)  # 导入时 upsert 的键
     generic_name = db.Column(db.String(100))
     indications = db.Column(db.Text)
     dosage = db.Column(db.Text)
@@ -33,8 +33,12 @@ class Medicine(db.Model):
 
 class UserMedicine(db.Model):
     __tablename__ = 'user_medicines'
+    __table_args__ = (
+        # 同一药品在用户药箱中只出现一次；唯一索引（而非表约束）便于在已有的 SQLite 表上补建
+        db.Index('uq_user_medicines_user_medicine', 'user_id', 'medicine_id', unique=True),
+    )
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
     medicine_id = db.Column(db.Integer, db.ForeignKey('medicines.id'), nullable=False)
     added_at = db.Column(db.DateTime, default=datetime.utcnow)
     
@@ -44,20 +48,113 @@ class UserMedicine(db.Model):
 
 class Schedule(db.Model):
     __tablename__ = 'schedules'
+    __table_args__ = (
+        # 今日任务：按药箱条目筛选有效期内的 active 计划
+        db.Index('ix_schedules_user_medicine_active', 'user_medicine_id', 'status', 'start_date', 'end_date'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     user_medicine_id = db.Column(db.Integer, db.ForeignKey('user_medicines.id'), nullable=False)
-    start_date = db.Column(db.String(10), nullable=False)  # ISO format structure logic YYYY-MM-DD
-    end_date = db.Column(db.String(10), nullable=False)
-    time_of_day = db.Column(db.String(200), nullable=False)  # Comma separated "08:00,12:00"
+    start_date = db.Column(db.Date, nullable=False)
+    end_date = db.Column(db.Date, nullable=False)
+    time_of_day = db.Column(db.String(200), nullable=False)  # 规整后的展示文本 "08:00,12:00"，逐个时间点见 dose_times
     dose = db.Column(db.String(50), nullable=False)
     status = db.Column(db.String(20), default='active')  # active, completed
+    slots_until = db.Column(db.Date, nullable=True)  # dose_slots 已生成到哪一天（含），为空表示尚未生成
     
+    dose_times = db.relationship('ScheduleTime', backref='schedule', lazy=True, cascade='all, delete-orphan',
+                                 order_by='ScheduleTime.time_of_day')
     # Cascade delete intake logs when a schedule is deleted
     intake_logs = db.relationship('IntakeLog', backref='schedule', lazy=True, cascade='all, delete-orphan')
+    dose_slots = db.relationship('DoseSlot', backref='schedule', lazy=True, cascade='all, delete-orphan')
+
+    @property
+    def times(self):
+        return [t.time_of_day.strftime('%H:%M') for t in self.dose_times]
+
+    def set_times(self, times):
+        """times 为 datetime.time 列表，同时更新子表与展示文本"""
+        times = sorted(set(times))
+        self.dose_times = [ScheduleTime(time_of_day=t) for t in times]
+        self.time_of_day = ','.join(t.strftime('%H:%M') for t in times)
+
+class ScheduleTime(db.Model):
+    __tablename__ = 'schedule_times'
+    __table_args__ = (
+        db.Index('uq_schedule_times_schedule_time', 'schedule_id', 'time_of_day', unique=True),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    schedule_id = db.Column(db.Integer, db.ForeignKey('schedules.id', ondelete='CASCADE'), nullable=False)
+    time_of_day = db.Column(db.Time, nullable=False)
+
+class DoseSlot(db.Model):
+    __tablename__ = 'dose_slots'
+    __table_args__ = (
+        db.Index('uq_dose_slots_schedule_date_time', 'schedule_id', 'slot_date', 'slot_time', unique=True),
+        # 今日任务 / 下一次服药：按用户 + 应服时间做范围扫描
+        db.Index('ix_dose_slots_user_due', 'user_id', 'due_at'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    schedule_id = db.Column(db.Integer, db.ForeignKey('schedules.id', ondelete='CASCADE'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    slot_date = db.Column(db.Date, nullable=False)
+    slot_time = db.Column(db.Time, nullable=False)
+    due_at = db.Column(db.DateTime, nullable=False)  # slot_date + slot_time，本地时间
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending, taken
+    taken_at = db.Column(db.DateTime, nullable=True)
 
 class IntakeLog(db.Model):
     __tablename__ = 'intake_logs'
+    __table_args__ = (
+        db.Index('ix_intake_logs_schedule_date', 'schedule_id', 'date_str'),
+        # 同一计划同一天的同一时间点只记一次；旧记录 slot_time 为空，不受约束
+        db.Index('uq_intake_logs_schedule_date_slot', 'schedule_id', 'date_str', 'slot_time', unique=True),
+    )
     id = db.Column(db.Integer, primary_key=True)
     schedule_id = db.Column(db.Integer, db.ForeignKey('schedules.id', ondelete='CASCADE'), nullable=False)
     taken_at = db.Column(db.DateTime, default=datetime.utcnow)
     date_str = db.Column(db.String(10), nullable=False) # "2023-10-27" to easily query "today"
+    slot_time = db.Column(db.Time, nullable=True)  # 对应 schedule_times 中的哪一次服药
+
+class AdherenceDaily(db.Model):
+    __tablename__ = 'adherence_daily'
+    __table_args__ = (
+        db.Index('uq_adherence_daily_schedule_date', 'schedule_id', 'date', unique=True),
+        # 依从性统计：按用户 + 日期范围扫描，与原始服药记录的多少无关
+        db.Index('ix_adherence_daily_user_date', 'user_id', 'date'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    user_medicine_id = db.Column(db.Integer, db.ForeignKey('user_medicines.id', ondelete='CASCADE'), nullable=False)
+    schedule_id = db.Column(db.Integer, db.ForeignKey('schedules.id', ondelete='CASCADE'), nullable=False)
+    date = db.Column(db.Date, nullable=False)
+    planned = db.Column(db.Integer, nullable=False)  # 当天应服次数
+    taken = db.Column(db.Integer, nullable=False, default=0)  # 当天已服次数（不超过 planned）
+
+class IdempotencyKey(db.Model):
+    __tablename__ = 'idempotency_keys'
+    __table_args__ = (
+        db.Index('uq_idempotency_keys_user_key', 'user_id', 'key', unique=True),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    key = db.Column(db.String(100), nullable=False)  # 客户端生成的 Idempotency-Key
+    response = db.Column(db.Text, nullable=False)  # 首次处理时返回的 JSON，重放时原样返回
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+class ConsultCacheEntry(db.Model):
+    __tablename__ = 'consult_cache'
+    key = db.Column(db.String(64), primary_key=True)  # sha1(知识库版本 + 规整后的症状)
+    value = db.Column(db.Text, nullable=False)  # JSON 格式的问诊结果
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+class RateLimitBucket(db.Model):
+    __tablename__ = 'rate_limit_buckets'
+    key = db.Column(db.String(128), primary_key=True)  # 限流名称 + 用户 id 或客户端 IP
+    tokens = db.Column(db.Float, nullable=False)  # 上次更新时剩余的令牌数
+    updated_at = db.Column(db.Float, nullable=False, index=True)  # Unix 时间戳（秒）
+
+class CatalogVersion(db.Model):
+    __tablename__ = 'catalog_versions'
+    id = db.Column(db.Integer, primary_key=True)  # 只有一行，id = 1
+    version = db.Column(db.Integer, nullable=False, default=0)  # 药品数据每次导入后 +1，各 worker 据此失效缓存
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
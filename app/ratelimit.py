@@ -0,0 +1,211 @@
+"""大模型接口的令牌桶限流。
+
+每个限流规则写作 "容量/秒数"，如 RATELIMIT_CONSULT=20/60 表示每个客户端最多连续 20 次，
+之后每 3 秒恢复一次。客户端按登录用户区分，未登录时按 IP。桶默认保存在进程内（memory），
+多 worker 部署时可改用 database，所有 worker 共享同一组桶。
+"""
+import math
+import time
+import logging
+import threading
+from collections import OrderedDict
+from functools import wraps
+from flask import jsonify, request, session
+
+logger = logging.getLogger(__name__)
+
+
+def parse_rule(text):
+    """'20/60' -> (容量 20, 每秒恢复 1/3 个)；空字符串或 0 表示不限流"""
+    if not text or text.strip() in ('0', 'off'):
+        return None
+    capacity, _, period = text.partition('/')
+    capacity, period = int(capacity), float(period or 60)
+    if capacity <= 0 or period <= 0:
+        raise ValueError(f"Invalid rate limit rule: {text!r}")
+    return capacity, capacity / period
+
+
+def _refill(tokens, updated_at, now, capacity, rate):
+    return min(capacity, tokens + (now - updated_at) * rate)
+
+
+def _decide(tokens, capacity, rate, cost):
+    """返回 (是否放行, 扣除后的令牌数, 需要等待的秒数)"""
+    if tokens >= cost:
+        return True, tokens - cost, 0.0
+    return False, tokens, (cost - tokens) / rate
+
+
+class MemoryBucketStore:
+    """进程内的令牌桶，超过 max_keys 个客户端时淘汰最久未访问的桶"""
+
+    def __init__(self, max_keys=10000):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()  # key -> (令牌数, 更新时间)
+        self._lock = threading.Lock()
+
+    def take(self, key, capacity, rate, cost=1):
+        now = time.time()
+        with self._lock:
+            tokens, updated_at = self._buckets.get(key, (capacity, now))
+            allowed, tokens, retry_after = _decide(_refill(tokens, updated_at, now, capacity, rate), capacity, rate, cost)
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return allowed, retry_after
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+class DatabaseBucketStore:
+    """存放在应用数据库中的令牌桶，供多 worker 共享。
+
+    补充令牌与扣减在一条带条件的 UPDATE ... RETURNING 里完成，由数据库保证原子性：SQLite 的写锁、
+    PostgreSQL 的行锁都会让并发的扣减依次执行，不会读到同一个旧值而少扣。
+    """
+
+    # 每这么多次请求清理一次早已回满的桶
+    PURGE_EVERY = 500
+
+    def __init__(self, max_keys=None):
+        self._calls = 0
+
+    def take(self, key, capacity, rate, cost=1):
+        from sqlalchemy import case, select, update
+        from .database import dialect_insert
+        from .extensions import db
+        from .models import RateLimitBucket
+        table = RateLimitBucket.__table__
+        now = time.time()
+        try:
+            # 首次访问时建一个满的桶；已存在时什么也不做
+            db.session.execute(dialect_insert(RateLimitBucket).values(
+                key=key, tokens=capacity, updated_at=now).on_conflict_do_nothing())
+            # 多台机器的时钟可能有偏差，经过的时间不小于 0
+            elapsed = case((table.c.updated_at < now, now - table.c.updated_at), else_=0.0)
+            refilled = table.c.tokens + elapsed * rate
+            refilled = case((refilled > capacity, float(capacity)), else_=refilled)
+            taken = db.session.execute(
+                update(table)
+                .where(table.c.key == key, refilled >= cost)
+                .values(tokens=refilled - cost,
+                        updated_at=case((table.c.updated_at < now, now), else_=table.c.updated_at))
+                .returning(table.c.tokens)
+            ).first()
+            retry_after = 0.0
+            if taken is None:
+                # 令牌不足：只读出当前值估算需要等待多久，不写入
+                tokens, updated_at = db.session.execute(
+                    select(table.c.tokens, table.c.updated_at).where(table.c.key == key)).one()
+                retry_after = _decide(_refill(tokens, min(updated_at, now), now, capacity, rate), capacity, rate, cost)[2]
+            db.session.commit()
+        except Exception as e:
+            # 限流存储故障时放行，不因此拒绝正常请求
+            db.session.rollback()
+            logger.warning("Rate limit store error: %s", e)
+            return True, 0.0
+        self._calls += 1
+        if self._calls % self.PURGE_EVERY == 0:
+            self.purge(capacity / rate)
+        return taken is not None, retry_after
+
+    def purge(self, full_after):
+        """删除闲置时间足以回满的桶，它们与不存在的桶等价"""
+        from .extensions import db
+        from .models import RateLimitBucket
+        RateLimitBucket.query.filter(RateLimitBucket.updated_at < time.time() - full_after).delete()
+        db.session.commit()
+
+    def clear(self):
+        from .extensions import db
+        from .models import RateLimitBucket
+        RateLimitBucket.query.delete()
+        db.session.commit()
+
+
+BUCKET_STORES = {
+    'memory': MemoryBucketStore,
+    'database': DatabaseBucketStore,
+}
+
+
+class RateLimiter:
+    """令牌桶限流扩展，规则来自 RATELIMIT_<名称> 配置项"""
+
+    def __init__(self, app=None):
+        self.enabled = False
+        self.store = None
+        self.rules = {}
+        self.rejected = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config.setdefault('RATELIMIT_ENABLED', True)
+        backend = app.config.setdefault('RATELIMIT_BACKEND', 'memory')
+        if backend not in BUCKET_STORES:
+            raise ValueError(f"Unknown RATELIMIT_BACKEND: {backend}")
+        self.store = BUCKET_STORES[backend](max_keys=app.config.setdefault('RATELIMIT_MAX_KEYS', 10000))
+        self.proxy_hops = int(app.config.setdefault('RATELIMIT_TRUST_PROXY', 0))
+        self.rules = {
+            'consult': parse_rule(app.config.setdefault('RATELIMIT_CONSULT', '20/60')),
+            'chat': parse_rule(app.config.setdefault('RATELIMIT_CHAT', '10/60')),
+        }
+        self.rejected = 0
+        app.extensions['ratelimit'] = self
+
+    def client_key(self, user_id=None, remote_addr=None, forwarded_for=None):
+        """登录用户按用户 id，否则按 IP。
+
+        部署在 N 层可信反向代理后（RATELIMIT_TRUST_PROXY=N）时，与 werkzeug ProxyFix(x_for=N) 一样取
+        X-Forwarded-For 从右数第 N 个地址：左边的部分由客户端自己填写，不能用来区分客户端。
+        """
+        if user_id is not None:
+            return f'user:{user_id}'
+        if self.proxy_hops and forwarded_for:
+            addresses = [a.strip() for a in forwarded_for.split(',') if a.strip()]
+            if len(addresses) >= self.proxy_hops:
+                return 'ip:' + addresses[-self.proxy_hops]
+        return f'ip:{remote_addr or "unknown"}'
+
+    def hit(self, name, client):
+        """消耗一个令牌，返回 (是否放行, 建议的重试等待秒数)"""
+        rule = self.rules.get(name)
+        if not self.enabled or rule is None:
+            return True, 0.0
+        allowed, retry_after = self.store.take(f'{name}:{client}', *rule)
+        if not allowed:
+            self.rejected += 1
+            logger.info("Rate limited %s for %s, retry after %.1fs", name, client, retry_after)
+        return allowed, retry_after
+
+    def limit(self, name):
+        """路由装饰器：超出限额时返回 429 与 Retry-After 头"""
+        def decorator(view):
+            @wraps(view)
+            def wrapped(*args, **kwargs):
+                client = self.client_key(session.get('user_id'), request.remote_addr,
+                                         request.headers.get('X-Forwarded-For'))
+                allowed, retry_after = self.hit(name, client)
+                if not allowed:
+                    return too_many_requests(retry_after)
+                return view(*args, **kwargs)
+            return wrapped
+        return decorator
+
+
+def retry_seconds(retry_after):
+    """Retry-After 只接受整数秒，向上取整且至少为 1"""
+    return max(1, math.ceil(retry_after))
+
+
+def too_many_requests(retry_after):
+    seconds = retry_seconds(retry_after)
+    response = jsonify({'error': 'Too many requests, please retry later', 'retry_after': seconds})
+    response.status_code = 429
+    response.headers['Retry-After'] = str(seconds)
+    return response
@@ -1,29 +1,67 @@
-import os
-import csv
-import json
-import pandas as pd
-from datetime import datetime
-from flask import Blueprint, render_template, request, redirect, url_for, session, flash, jsonify, Response, stream_with_context
-from .extensions import db
-from .models import User, Medicine, UserMedicine, Schedule, IntakeLog
-from openai import OpenAI
+import time
+import logging
+from datetime import datetime, date, timedelta
+from flask import Blueprint, current_app, abort, make_response, render_template, request, redirect, url_for, session, flash, jsonify, Response, stream_with_context
+from .extensions import db, llm, consult_cache, catalog_cache, metrics, ratelimiter
+from .models import User, Medicine, UserMedicine, Schedule
+from .consult import consult
+from .search import search_medicines
+from .services import get_todays_tasks, get_cabinet, cabinet_item, parse_date, parse_times
+from .intake import record_intakes, replay, commit_with_key, MAX_BATCH
+from .adherence import adherence_report
+from .slots import materialize, next_doses
+from .chat import chat_params, budget_headers, FrameCoalescer, error_frame, DONE_FRAME
+from .catalog import medicine_dict
+from .llm import LLMBusyError
+from .database import dialect_insert
 
 main = Blueprint('main', __name__)
+logger = logging.getLogger(__name__)
 
 # --- Helper Functions ---
 
-def get_db_medicines():
-    return Medicine.query.all()
-
-def load_knowledge_base():
-    # Load CSV knowledge base
-    csv_path = os.path.join(os.path.dirname(__file__), '../data/symptom_knowledge.csv')
-    try:
-        df = pd.read_csv(csv_path)
-        return df.to_dict(orient='records')
-    except Exception as e:
-        print(f"Error loading knowledge base: {e}")
-        return []
+def page_args(page, per_page, max_per_page=100):
+    """把查询参数中的页码与每页数量限制在合法范围内（页码至少为 1，每页 1..max_per_page）"""
+    return max(page or 1, 1), max(1, min(per_page, max_per_page))
+
+def get_db_medicines(q='', page=1, per_page=None):
+    """分页检索药品，返回 (当前页药品 dict 列表, 命中总数, 页码, 每页数量)，结果经目录缓存"""
+    cfg = current_app.config
+    page, per_page = page_args(page, per_page or cfg['MEDICINES_PER_PAGE'])
+
+    def load():
+        items, total = search_medicines(q, page, per_page, cfg['MEDICINE_SEARCH_BACKEND'], cfg['SEARCH_INDEX_MAX_AGE'])
+        return [medicine_dict(m) for m in items], total
+
+    items, total = catalog_cache.get_or_load(('list', q, page, per_page), load)
+    return items, total, page, per_page
+
+def medicine_summary(med):
+    return {
+        'id': med['id'],
+        'name': med['name'],
+        'generic_name': med['generic_name'],
+        'indications': med['indications'],
+    }
+
+def catalog_etag(*key):
+    """目录页面的 ETag；导航栏随登录用户变化，因此把用户也算进去"""
+    return catalog_cache.etag(key, session.get('user_id'), session.get('nickname'))
+
+def not_modified(etag):
+    """客户端缓存仍然有效时直接返回 304，不渲染、不访问数据库；有待显示的 flash 消息时除外"""
+    if session.get('_flashes') or not request.if_none_match.contains(etag):
+        return None
+    catalog_cache.not_modified += 1
+    response = make_response('', 304)
+    response.set_etag(etag)
+    return response
+
+def with_validators(response, etag):
+    response.set_etag(etag)
+    response.last_modified = catalog_cache.updated_at
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
 
 # --- Routes ---
 
@@ -74,19 +112,79 @@ def logout():
 
 @main.route('/medicines')
 def medicine_list():
-    medicines = get_db_medicines()
-    return render_template('medicines.html', medicines=medicines)
+    q = request.args.get('q', '').strip()
+    page = max(request.args.get('page', 1, type=int), 1)
+    etag = catalog_etag('list', q, page)
+    cached = not_modified(etag)
+    if cached:
+        return cached
+    medicines, total, page, per_page = get_db_medicines(q, page)
+    pages = max((total + per_page - 1) // per_page, 1)
+    response = make_response(render_template('medicines.html', medicines=medicines, q=q, page=page, pages=pages, total=total))
+    return with_validators(response, etag)
+
+@main.route('/api/medicines/search')
+def medicine_search_api():
+    q = request.args.get('q', '').strip()
+    page = request.args.get('page', 1, type=int)
+    medicines, total, page, per_page = get_db_medicines(q, page, request.args.get('per_page', type=int))
+    return jsonify({
+        'q': q,
+        'page': page,
+        'per_page': per_page,
+        'total': total,
+        'items': [medicine_summary(m) for m in medicines],
+    })
 
 @main.route('/medicines/<int:medicine_id>')
 def medicine_detail(medicine_id):
-    medicine = Medicine.query.get_or_404(medicine_id)
-    return render_template('medicine_detail.html', medicine=medicine)
+    etag = catalog_etag('detail', medicine_id)
+    cached = not_modified(etag)
+    if cached:
+        return cached
+
+    def load():
+        medicine = db.session.get(Medicine, medicine_id)
+        return medicine_dict(medicine) if medicine else None
+
+    medicine = catalog_cache.get_or_load(('detail', medicine_id), load)
+    if medicine is None:
+        abort(404)
+    response = make_response(render_template('medicine_detail.html', medicine=medicine))
+    return with_validators(response, etag)
+
+@main.route('/api/cache/stats')
+def cache_stats():
+    """缓存内部状态，与 /metrics 使用同一个 METRICS_TOKEN 保护"""
+    denied = metrics.check_token()
+    if denied:
+        return denied
+    return jsonify({
+        'consult': consult_cache.stats(),
+        'catalog': catalog_cache.stats(),
+    })
 
 @main.route('/my_medicines')
 def my_medicines():
     if 'user_id' not in session: return redirect(url_for('main.index'))
-    user_medicines = UserMedicine.query.filter_by(user_id=session['user_id']).all()
-    return render_template('my_medicines.html', user_medicines=user_medicines)
+    page = request.args.get('page', 1, type=int)
+    cabinet = get_cabinet(session['user_id'], page, current_app.config['CABINET_PER_PAGE'])
+    return render_template('my_medicines.html', user_medicines=cabinet.items, page=cabinet.page,
+                           pages=cabinet.pages, total=cabinet.total)
+
+@main.route('/api/my_medicines')
+def my_medicines_api():
+    """药箱的精简 JSON：?page=1&per_page=20"""
+    if 'user_id' not in session: return jsonify({'error': 'Unauthorized'}), 401
+    page, per_page = page_args(request.args.get('page', 1, type=int),
+                               request.args.get('per_page', current_app.config['CABINET_PER_PAGE'], type=int))
+    cabinet = get_cabinet(session['user_id'], page, per_page)
+    return jsonify({
+        'items': [cabinet_item(um) for um in cabinet.items],
+        'page': cabinet.page,
+        'pages': cabinet.pages,
+        'total': cabinet.total,
+    })
 
 @main.route('/add_medicine/<int:medicine_id>', methods=['POST'])
 def add_to_cabinet(medicine_id):
@@ -94,11 +192,14 @@ def add_to_cabinet(medicine_id):
         flash('请先登录后再将药品加入药箱', 'danger')
         return redirect(url_for('main.medicine_detail', medicine_id=medicine_id))
     
-    exists = UserMedicine.query.filter_by(user_id=session['user_id'], medicine_id=medicine_id).first()
-    if not exists:
-        um = UserMedicine(user_id=session['user_id'], medicine_id=medicine_id)
-        db.session.add(um)
-        db.session.commit()
+    # 按唯一索引插入，重复点击 / 并发请求时不会因唯一约束报错
+    added = db.session.execute(
+        dialect_insert(UserMedicine)
+        .values(user_id=session['user_id'], medicine_id=medicine_id, added_at=datetime.utcnow())
+        .on_conflict_do_nothing(index_elements=['user_id', 'medicine_id'])
+    ).rowcount
+    db.session.commit()
+    if added:
         flash('已添加到您的药箱', 'success')
     else:
         flash('该药品已在您的药箱中', 'info')
@@ -117,20 +218,30 @@ def remove_from_cabinet(user_medicine_id):
 @main.route('/schedule/add/<int:user_medicine_id>', methods=['POST'])
 def add_schedule(user_medicine_id):
     if 'user_id' not in session: return redirect(url_for('main.index'))
+    um = UserMedicine.query.filter_by(id=user_medicine_id, user_id=session['user_id']).first_or_404()
     
-    start_date = request.form.get('start_date')
-    end_date = request.form.get('end_date')
-    times = request.form.get('times') # "08:00, 12:00"
+    try:
+        start_date = parse_date(request.form.get('start_date'))
+        end_date = parse_date(request.form.get('end_date'))
+        times = parse_times(request.form.get('times') or '')  # "08:00, 12:00"
+    except ValueError:
+        flash('请填写正确的日期和服药时间（如 08:00, 12:00）', 'danger')
+        return redirect(url_for('main.my_medicines'))
+    if end_date < start_date:
+        flash('结束日期不能早于开始日期', 'danger')
+        return redirect(url_for('main.my_medicines'))
     dose = request.form.get('dose')
     
     schedule = Schedule(
-        user_medicine_id=user_medicine_id,
+        user_medicine_id=um.id,
         start_date=start_date,
         end_date=end_date,
-        time_of_day=times,
         dose=dose
     )
+    schedule.set_times(times)
     db.session.add(schedule)
+    db.session.flush()
+    materialize(um.user_id, [schedule])  # 写入时就展开成逐次的服药时间点
     db.session.commit()
     flash('用药计划已设置', 'success')
     return redirect(url_for('main.my_medicines'))
@@ -140,51 +251,97 @@ def dashboard():
     if 'user_id' not in session: return redirect(url_for('main.index'))
     
     today_str = datetime.now().strftime('%Y-%m-%d')
-    user_medicines = UserMedicine.query.filter_by(user_id=session['user_id']).all()
-    
-    todays_tasks = []
-    
-    for um in user_medicines:
-        for sch in um.schedules:
-            if sch.start_date <= today_str <= sch.end_date and sch.status == 'active':
-                # Check logs for today
-                logs = IntakeLog.query.filter_by(schedule_id=sch.id, date_str=today_str).all()
-                taken_count = len(logs)
-                
-                times = [t.strip() for t in sch.time_of_day.replace('，', ',').split(',')]
-                total_times = len(times)
-                
-                # Simple logic: if taken count < total times, it's pending (or partially done)
-                status = 'completed' if taken_count >= total_times else 'pending'
-                
-                todays_tasks.append({
-                    'medicine_name': um.medicine.name,
-                    'dose': sch.dose,
-                    'times': times,
-                    'schedule_id': sch.id,
-                    'status': status,
-                    'taken_count': taken_count,
-                    'total_count': total_times
-                })
-                
+    todays_tasks = get_todays_tasks(session['user_id'], today_str)
     return render_template('dashboard.html', tasks=todays_tasks, today=today_str)
 
+@main.route('/api/schedules/today')
+def todays_tasks_api():
+    if 'user_id' not in session: return jsonify({'error': 'Unauthorized'}), 401
+
+    today_str = datetime.now().strftime('%Y-%m-%d')
+    return jsonify({'date': today_str, 'tasks': get_todays_tasks(session['user_id'], today_str)})
+
+@main.route('/api/schedules/next')
+def next_doses_api():
+    """今天已到时间但未服的时间点，以及接下来的若干次服药（?limit=5）"""
+    if 'user_id' not in session: return jsonify({'error': 'Unauthorized'}), 401
+    limit = min(max(request.args.get('limit', 5, type=int), 1), 50)
+    return jsonify(next_doses(session['user_id'], limit=limit))
+
 @main.route('/schedule/mark_taken/<int:schedule_id>', methods=['POST'])
 def mark_taken(schedule_id):
+    """单次打卡；可在 JSON 中指定 slot（"08:00"），否则记到今天第一个未打卡的时间点"""
     if 'user_id' not in session: return jsonify({'error': 'Unauthorized'}), 401
-    
-    today_str = datetime.now().strftime('%Y-%m-%d')
-    log = IntakeLog(schedule_id=schedule_id, date_str=today_str)
-    db.session.add(log)
+
+    data = request.get_json(silent=True) or {}
+    results, progress = record_intakes(session['user_id'], [{'schedule_id': schedule_id, 'slot': data.get('slot')}])
+    status = results[0]['status']
+    if status == 'not_found':
+        return jsonify({'error': 'Schedule not found'}), 404
+    if status == 'invalid':
+        return jsonify({'error': 'Invalid dose time or schedule not active today'}), 400
     db.session.commit()
-    
-    return jsonify({'success': True})
+    if status == 'complete':
+        return jsonify({'error': 'All doses already taken today', **progress[0]}), 409
+    return jsonify({'success': True, 'duplicate': status == 'duplicate', 'slot': results[0].get('slot'), **progress[0]})
+
+@main.route('/api/intake/batch', methods=['POST'])
+def intake_batch():
+    """批量打卡：{"marks": [{"schedule_id": 1, "slot": "08:00", "date": "2024-05-01"}, ...]}
+
+    全部记录在一个事务中写入；带 Idempotency-Key 请求头（或 idempotency_key 字段）时，重试返回第一次的结果。
+    """
+    if 'user_id' not in session: return jsonify({'error': 'Unauthorized'}), 401
+
+    data = request.get_json(silent=True) or {}
+    marks = data.get('marks')
+    if not isinstance(marks, list) or not marks:
+        return jsonify({'error': 'No marks provided'}), 400
+    if len(marks) > MAX_BATCH:
+        return jsonify({'error': f'At most {MAX_BATCH} marks per request'}), 400
+
+    user_id = session['user_id']
+    key = request.headers.get('Idempotency-Key') or data.get('idempotency_key')
+    if key:
+        key = str(key)[:100]
+        previous = replay(user_id, key)
+        if previous is not None:
+            response = jsonify(previous)
+            response.headers['Idempotent-Replayed'] = 'true'
+            return response
+
+    results, progress = record_intakes(user_id, [m if isinstance(m, dict) else {} for m in marks])
+    body = {
+        'success': True,
+        'recorded': sum(r['status'] == 'recorded' for r in results),
+        'results': results,
+        'schedules': progress,
+    }
+    return jsonify(commit_with_key(user_id, key, body))
+
+@main.route('/api/adherence')
+def adherence_api():
+    """依从性统计：?from=YYYY-MM-DD&to=YYYY-MM-DD&user_medicine_id=&schedule_id=，默认最近 30 天"""
+    if 'user_id' not in session: return jsonify({'error': 'Unauthorized'}), 401
+
+    try:
+        end = parse_date(request.args['to']) if request.args.get('to') else date.today()
+        start = parse_date(request.args['from']) if request.args.get('from') else end - timedelta(days=29)
+        report = adherence_report(
+            session['user_id'], start, end,
+            user_medicine_id=request.args.get('user_medicine_id', type=int),
+            schedule_id=request.args.get('schedule_id', type=int),
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(report)
 
 @main.route('/ai_consult_page')
 def ai_consult_page():
     return render_template('ai_consult.html')
 
 @main.route('/api/ai_consult', methods=['POST'])
+@ratelimiter.limit('consult')
 def ai_consult_api():
     data = request.json
     symptom = data.get('symptom')
@@ -192,126 +349,42 @@ def ai_consult_api():
     if not symptom:
         return jsonify({'error': 'No symptom provided'}), 400
 
-    # 1. Load context from CSV (Simple Context Injection)
-    kb_data = load_knowledge_base()
-    kb_text = "\n".join([f"- 症状: {row['symptom_text']} -> 可能疾病: {row['disease']}, 建议: {row['advice']}, 警示: {row['red_flags']}" for row in kb_data])
-
-    # 2. Call DeepSeek API
-    api_key = os.environ.get("DEEPSEEK_API_KEY")
-    if not api_key:
-         # Fallback to Mock if no key
-        return jsonify({
-            'disease': 'API Key Missing',
-            'advice': '请在服务器环境变量中配置 DEEPSEEK_API_KEY 以使用 AI 功能。当前仅演示模拟回复。',
-            'red_flags': '无法连接AI服务。'
-        })
-
-    client = OpenAI(api_key=api_key, base_url="https://api.deepseek.com")
-
-    try:
-        response = client.chat.completions.create(
-            model="deepseek-chat",
-            messages=[
-                {"role": "system", "content": f"""
-                 你是一个专业的辅助医疗AI助手。请根据用户的症状描述，结合以下的参考知识库，给出可能的疾病推测、医疗建议和警示信号。
-                 
-                 参考知识库：
-                 {kb_text}
-                 
-                 请以JSON格式返回结果，包含三个字段：
-                 - disease: 可能的疾病名称（如果无法确定，请说明）
-                 - advice: 具体的医疗建议（分点列出）
-                 - red_flags: 需要立即就医的严重症状警示
-                 
-                 注意：必须在回复末尾添加“本平台内容仅供科普参考，不能替代专业医疗建议。如有不适，请及时就医。”
-                 """},
-                {"role": "user", "content": f"我感觉：{symptom}"}
-            ],
-            response_format={ "type": "json_object" } # DeepSeek supports JSON mode
-        )
-        content = response.choices[0].message.content
-        import json
-        result = json.loads(content)
-        return jsonify(result)
-
-    except Exception as e:
-        print(f"AI API Error: {e}")
-        return jsonify({'error': 'AI service temporarily unavailable'}), 500
+    # 本地 TF-IDF 检索 top-k 条目，只把命中条目交给 DeepSeek；无 Key 或分数足够高时直接由知识库作答
+    result, status = consult(symptom)
+    return jsonify(result), status
 
 
 # DeepSeek 流式聊天 API
 @main.route('/api/chat/deepseek', methods=['POST'])
+@ratelimiter.limit('chat')
 def deepseek_chat_stream():
     """DeepSeek 流式聊天接口，支持 deepseek-chat 和 deepseek-reasoner 模型"""
-    api_key = os.environ.get("DEEPSEEK_API_KEY")
-    base_url = os.environ.get("DEEPSEEK_BASE_URL", "https://api.deepseek.com")
-    
-    # 调试信息
-    print(f"[DEBUG] API Key exists: {bool(api_key)}")
-    print(f"[DEBUG] API Key length: {len(api_key) if api_key else 0}")
-    print(f"[DEBUG] Base URL: {base_url}")
-    
-    if not api_key:
-        print("[ERROR] DeepSeek API Key not configured")
+    if not llm.available:
+        logger.error("DeepSeek API key not configured")
         return jsonify({'error': 'DeepSeek API Key not configured'}), 500
     
     try:
         data = request.json
-        messages = data.get('messages', [])
-        model = data.get('model', 'deepseek-chat')
-        temperature = data.get('temperature', 1.3)
-        
-        print(f"[DEBUG] Model: {model}")
-        print(f"[DEBUG] Messages count: {len(messages)}")
-        
-        # 默认系统提示词
-        default_system_prompt = {
-            "role": "system",
-            "content": """你是"小晴"，一个基于大语言模型的 AI 智能辅助问诊助手。
-
-【你的身份】
-- 你是 AI 智能辅助问诊模型，专门为用户提供健康问题的初步分析和建议
-- 你具备医学知识，但你不是真正的医生，你的建议仅供参考
-
-【你的职责】
-1. **智能分析症状**：根据用户描述的症状，结合医学知识进行初步分析
-2. **提供参考建议**：给出可能的疾病方向、就医建议、日常护理建议
-3. **倾听与共情**：用温暖、专业的语言与用户交流，缓解其焦虑
-4. **安全提醒**：当症状严重或紧急时，明确建议立即就医
-5. **用药指导**：提供用药的一般性建议，但强调需遵医嘱
-
-【回答原则】
-- 回答时要专业但不晦涩，用通俗易懂的语言解释医学概念
-- 对不确定的问题要诚实说明，不要给出模棱两可的答案
-- 每次回答后都要提醒："本建议仅供参考，如症状持续或加重，请及时就医"
-- 保持温和、耐心、友善的语气，像一个关心用户健康的朋友
-
-【回答格式参考】
-当用户描述症状时，你可以这样回答：
-1. 理解和共情："我理解您现在的感受..."
-2. 症状分析："根据您描述的症状..."
-3. 可能原因："这可能是由于..."
-4. 建议措施："建议您..."
-5. 就医指导："如果...情况，建议立即就医"
-6. 免责声明："以上建议仅供参考，请以医生诊断为准"
-
-记住：你是 AI 智能辅助问诊模型，你的目标是提供有价值的健康参考信息，但不能替代专业医疗诊断。"""
-        }
+        final_messages, model, temperature, budget = chat_params(data, current_app.config)
+        logger.debug("Chat request: model=%s messages=%d tokens=%d trim=%s",
+                     model, len(final_messages), budget['tokens_out'], budget['decision'])
         
-        # 检查是否已有 system 消息
-        has_system_message = any(msg.get('role') == 'system' for msg in messages)
-        final_messages = messages if has_system_message else [default_system_prompt] + messages
-        
-        # 初始化 OpenAI 客户端
-        print(f"[DEBUG] Initializing OpenAI client with base_url: {base_url}")
-        client = OpenAI(api_key=api_key, base_url=base_url)
+        # 占用一个上游并发名额，直到流结束（或客户端断开）才释放
+        try:
+            release = llm.acquire()
+        except LLMBusyError:
+            return jsonify({'error': 'AI service is busy, please retry later'}), 503
+
+        coalescer = FrameCoalescer(current_app.config['CHAT_COALESCE_MS'], current_app.config['CHAT_COALESCE_BYTES'])
 
         def generate():
             """生成器函数，用于流式响应"""
+            start = time.perf_counter()
+            ttft = None
+            outcome = 'ok'
             try:
-                print(f"[DEBUG] Starting stream request to DeepSeek API...")
                 # 调用 DeepSeek API
-                stream = client.chat.completions.create(
+                stream = llm.client.chat.completions.create(
                     model=model,
                     messages=final_messages,
                     stream=True,
@@ -319,56 +392,43 @@ def deepseek_chat_stream():
                     max_tokens=4000
                 )
                 
-                print(f"[DEBUG] Stream started successfully")
-                # 逐块返回数据
+                # 逐块返回数据，按时间 / 字节窗口合并成帧
                 for chunk in stream:
                     if chunk.choices:
-                        delta = chunk.choices[0].delta
-                        
-                        # 构建响应数据
-                        response_data = {
-                            'choices': [{
-                                'delta': {}
-                            }]
-                        }
-                        
-                        # DeepSeek R1 的思考过程
-                        if hasattr(delta, 'reasoning_content') and delta.reasoning_content:
-                            response_data['choices'][0]['delta']['reasoning_content'] = delta.reasoning_content
-                        
-                        # 实际回复内容
-                        if hasattr(delta, 'content') and delta.content:
-                            response_data['choices'][0]['delta']['content'] = delta.content
-                        
-                        # 如果有数据，则发送
-                        if response_data['choices'][0]['delta']:
-                            yield f"data: {json.dumps(response_data, ensure_ascii=False)}\n\n"
+                        if ttft is None:
+                            ttft = time.perf_counter() - start
+                        yield from coalescer.push(chunk.choices[0].delta)
                 
                 # 发送结束标记
-                print(f"[DEBUG] Stream completed successfully")
-                yield "data: [DONE]\n\n"
+                yield from coalescer.flush()
+                yield DONE_FRAME
                 
             except Exception as e:
-                print(f"[ERROR] Stream Error: {type(e).__name__}: {str(e)}")
-                import traceback
-                traceback.print_exc()
-                error_data = {
-                    'error': f'{type(e).__name__}: {str(e)}'
-                }
-                yield f"data: {json.dumps(error_data, ensure_ascii=False)}\n\n"
+                outcome = 'error'
+                logger.exception("Stream error")
+                yield from coalescer.flush()
+                yield error_frame(e)
+            except GeneratorExit:
+                outcome = 'disconnected'
+                raise
+            finally:
+                release()
+                metrics.observe_llm(model, 'wsgi', time.perf_counter() - start, ttft, outcome)
         
-        return Response(
+        response = Response(
             stream_with_context(generate()),
             mimetype='text/event-stream',
             headers={
                 'Cache-Control': 'no-cache',
-                'X-Accel-Buffering': 'no'
+                'X-Accel-Buffering': 'no',
+                **budget_headers(budget),
             }
         )
+        # 生成器可能从未被迭代（客户端提前断开），在响应关闭时兜底释放名额
+        response.call_on_close(release)
+        return response
         
     except Exception as e:
-        print(f"[ERROR] API Route Error: {type(e).__name__}: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Chat route error")
         return jsonify({'error': 'Internal Server Error', 'details': str(e)}), 500
 
@@ -0,0 +1,123 @@
+import time
+import threading
+from sqlalchemy import or_, case
+from .extensions import db
+from .models import Medicine
+from .knowledge import split_phrases
+
+# 名称命中比通用名、适应症命中更重要
+FIELD_WEIGHTS = (('name', 3.0), ('generic_name', 2.0), ('indications', 1.0))
+
+
+def index_grams(text):
+    """建索引用：每个短语的单字与相邻双字"""
+    grams = set()
+    for phrase in split_phrases(text):
+        grams.update(phrase)
+        grams.update(phrase[i:i + 2] for i in range(len(phrase) - 1))
+    return grams
+
+
+def query_grams(text):
+    """查询用：短语长度 >= 2 时只取双字（所有双字都命中近似于子串匹配），单字短语取单字"""
+    grams = set()
+    for phrase in split_phrases(text):
+        if len(phrase) == 1:
+            grams.add(phrase)
+        else:
+            grams.update(phrase[i:i + 2] for i in range(len(phrase) - 1))
+    return grams
+
+
+class MedicineSearchIndex:
+    """药品名称 / 通用名 / 适应症的内存倒排索引（中文单字 + 双字）"""
+
+    def __init__(self, rows):
+        self.postings = {}  # gram -> {medicine_id: 权重}
+        self.names = {}
+        for medicine_id, name, generic_name, indications in rows:
+            self.names[medicine_id] = (name or '').lower()
+            for (_, weight), value in zip(FIELD_WEIGHTS, (name, generic_name, indications)):
+                for gram in index_grams(value):
+                    bucket = self.postings.setdefault(gram, {})
+                    if bucket.get(medicine_id, 0) < weight:
+                        bucket[medicine_id] = weight
+        self.built_at = time.monotonic()
+
+    def search(self, q):
+        """返回所有 n-gram 都命中的药品 id，按命中权重降序（名称以查询开头的排最前）"""
+        grams = query_grams(q)
+        if not grams:
+            return []
+        buckets = sorted((self.postings.get(g, {}) for g in grams), key=len)
+        if not buckets[0]:
+            return []
+        scores = dict(buckets[0])
+        for bucket in buckets[1:]:
+            scores = {mid: score + bucket[mid] for mid, score in scores.items() if mid in bucket}
+            if not scores:
+                return []
+        prefix = q.strip().lower()
+        return sorted(scores, key=lambda mid: (not self.names[mid].startswith(prefix), -scores[mid], mid))
+
+
+_lock = threading.Lock()
+_index = None
+
+
+def get_search_index(max_age=300):
+    """进程内共享的索引，首次使用时构建；超过 max_age 秒或被 invalidate 后重建（多 worker 部署下保证最终一致）"""
+    global _index
+    index = _index
+    if index is None or time.monotonic() - index.built_at > max_age:
+        with _lock:
+            if _index is None or time.monotonic() - _index.built_at > max_age:
+                rows = db.session.query(Medicine.id, Medicine.name, Medicine.generic_name, Medicine.indications).all()
+                _index = MedicineSearchIndex(rows)
+            index = _index
+    return index
+
+
+def invalidate_search_index():
+    """药品数据变化（导入 / 种子数据）后调用"""
+    global _index
+    with _lock:
+        _index = None
+
+
+def _search_postgres(q, page, per_page):
+    """PostgreSQL：ILIKE 子串匹配，由 pg_trgm 的 GIN 索引加速（见 flask upgrade-db）"""
+    escaped = q.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    pattern = '%' + escaped + '%'
+    rank = case(
+        (Medicine.name.ilike(escaped + '%'), 0),
+        (Medicine.name.ilike(pattern), 1),
+        (Medicine.generic_name.ilike(pattern), 2),
+        else_=3,
+    )
+    query = (
+        Medicine.query
+        .filter(or_(Medicine.name.ilike(pattern), Medicine.generic_name.ilike(pattern), Medicine.indications.ilike(pattern)))
+        .order_by(rank, Medicine.id)
+    )
+    pagination = query.paginate(page=page, per_page=per_page, error_out=False)
+    return pagination.items, pagination.total
+
+
+def search_medicines(q, page=1, per_page=20, backend='auto', max_age=300):
+    """分页检索药品，返回 (当前页的 Medicine 列表, 命中总数)；q 为空时按 id 列出全部"""
+    q = (q or '').strip()
+    page = max(page, 1)
+    if not q:
+        pagination = Medicine.query.order_by(Medicine.id).paginate(page=page, per_page=per_page, error_out=False)
+        return pagination.items, pagination.total
+
+    if backend == 'postgres' or (backend == 'auto' and db.engine.dialect.name == 'postgresql'):
+        return _search_postgres(q, page, per_page)
+
+    ids = get_search_index(max_age).search(q)
+    page_ids = ids[(page - 1) * per_page:page * per_page]
+    if not page_ids:
+        return [], len(ids)
+    by_id = {m.id: m for m in Medicine.query.filter(Medicine.id.in_(page_ids))}
+    return [by_id[mid] for mid in page_ids if mid in by_id], len(ids)
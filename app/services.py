@@ -0,0 +1,87 @@
+from datetime import datetime, date, time, timedelta
+from sqlalchemy.orm import joinedload, selectinload
+from .models import UserMedicine, Schedule, DoseSlot
+from .slots import ensure_slots, slot_query
+
+
+def parse_times(time_of_day):
+    """"08:00, 12:00" / "8:00，12:00" -> [time(8, 0), time(12, 0)]；格式不对时抛出 ValueError"""
+    times = set()
+    for t in time_of_day.replace('，', ',').split(','):
+        if t.strip():
+            times.add(datetime.strptime(t.strip(), '%H:%M').time())
+    if not times:
+        raise ValueError('No dose time given')
+    return sorted(times)
+
+
+def parse_date(value):
+    """表单中的 "YYYY-MM-DD" -> date；格式不对时抛出 ValueError"""
+    return date.fromisoformat((value or '').strip())
+
+
+def get_todays_tasks(user_id, today_str=None):
+    """今日需服药清单：一次扫描当天物化的服药时间点（见 slots.py），按计划分组，每个时间点带自己的状态。
+
+    页面与 JSON 接口共用。
+    """
+    today_str = today_str or datetime.now().strftime('%Y-%m-%d')
+    today = date.fromisoformat(today_str)
+    ensure_slots(user_id, today)
+    start = datetime.combine(today, time.min)
+    rows = (
+        slot_query(user_id, start, start + timedelta(days=1))
+        .order_by(UserMedicine.id, DoseSlot.schedule_id, DoseSlot.due_at)
+        .all()
+    )
+
+    tasks = {}
+    for schedule_id, due_at, status, _, dose, medicine_name, _ in rows:
+        task = tasks.get(schedule_id)
+        if task is None:
+            task = tasks[schedule_id] = {
+                'medicine_name': medicine_name,
+                'dose': dose,
+                'times': [],
+                'slots': [],
+                'schedule_id': schedule_id,
+                'taken_count': 0,
+            }
+        task['times'].append(due_at.strftime('%H:%M'))
+        task['slots'].append({'time': due_at.strftime('%H:%M'), 'status': status})
+        task['taken_count'] += status == 'taken'
+    for task in tasks.values():
+        task['total_count'] = len(task['slots'])
+        task['status'] = 'completed' if task['taken_count'] >= task['total_count'] else 'pending'
+    return list(tasks.values())
+
+
+def get_cabinet(user_id, page=1, per_page=20):
+    """分页取出用户药箱：药品随条目 JOIN 取回，有效计划用一条 IN 查询批量取回，每页固定 3 条语句（计数、条目、计划）"""
+    return (
+        UserMedicine.query
+        .filter_by(user_id=user_id)
+        .options(
+            joinedload(UserMedicine.medicine),
+            selectinload(UserMedicine.schedules.and_(Schedule.status == 'active')),
+        )
+        .order_by(UserMedicine.id)
+        .paginate(page=page, per_page=per_page, error_out=False)
+    )
+
+
+def cabinet_item(um):
+    """药箱页面用到的字段"""
+    return {
+        'id': um.id,
+        'added_at': um.added_at.strftime('%Y-%m-%d') if um.added_at else None,
+        'medicine': {'id': um.medicine.id, 'name': um.medicine.name, 'generic_name': um.medicine.generic_name},
+        'schedules': [{
+            'id': sch.id,
+            'start_date': sch.start_date.isoformat(),
+            'end_date': sch.end_date.isoformat(),
+            'times': sch.time_of_day.split(','),
+            'dose': sch.dose,
+            'status': sch.status,
+        } for sch in um.schedules],
+    }
@@ -0,0 +1,176 @@
+"""服药时间点物化：把计划按天展开成 dose_slots（日期、时间、状态）。
+
+计划创建时先生成 DOSE_SLOT_WINDOW_DAYS 天；之后在读取今日任务 / 下一次服药时，
+已生成的天数不足半个窗口就顺延一个窗口。"今天要吃什么""下一次是什么时候"
+因此都是 (user_id, due_at) 索引上的一次范围扫描，每个时间点有自己的服用状态。
+"""
+from datetime import datetime, date, time, timedelta
+from flask import current_app
+from sqlalchemy import and_, bindparam, or_, update
+from .extensions import db
+from .database import dialect_insert
+from .models import Medicine, UserMedicine, Schedule, ScheduleTime, IntakeLog, DoseSlot
+
+
+def _window_days():
+    return current_app.config.get('DOSE_SLOT_WINDOW_DAYS', 14)
+
+
+def materialize(user_id, schedules, today=None):
+    """为这些计划生成到 today + 窗口天数（不超过结束日期）为止的时间点，不提交事务。
+
+    已有的服药记录会同步到对应时间点的状态上；没有时间点的旧记录按顺序占用当天最早的时间点。
+    """
+    today = today or date.today()
+    horizon = today + timedelta(days=_window_days())
+    ranges = {}
+    for schedule in schedules:
+        begin = schedule.slots_until + timedelta(days=1) if schedule.slots_until else max(schedule.start_date, today)
+        end = min(schedule.end_date, horizon)
+        if begin <= end:
+            ranges[schedule.id] = (begin, end)
+            schedule.slots_until = end
+        elif schedule.end_date < begin:
+            schedule.slots_until = schedule.end_date  # 已过期或已生成完，之后不再检查
+    if not ranges:
+        return 0
+
+    times = {}
+    for schedule_id, t in (
+        db.session.query(ScheduleTime.schedule_id, ScheduleTime.time_of_day)
+        .filter(ScheduleTime.schedule_id.in_(ranges))
+        .order_by(ScheduleTime.schedule_id, ScheduleTime.time_of_day)
+    ):
+        times.setdefault(schedule_id, []).append(t)
+
+    # 只有今天及以前可能已经有服药记录
+    logged = {}
+    first_day = min(begin for begin, _ in ranges.values())
+    if first_day <= today:
+        for schedule_id, date_str, slot, taken_at in (
+            db.session.query(IntakeLog.schedule_id, IntakeLog.date_str, IntakeLog.slot_time, IntakeLog.taken_at)
+            .filter(IntakeLog.schedule_id.in_(ranges),
+                    IntakeLog.date_str >= first_day.isoformat(), IntakeLog.date_str <= today.isoformat())
+            .order_by(IntakeLog.id)
+        ):
+            logged.setdefault((schedule_id, date_str), []).append((slot, taken_at))
+
+    rows = []
+    for schedule_id, (begin, end) in ranges.items():
+        day = begin
+        while day <= end:
+            taken = {}
+            legacy = []
+            for slot, taken_at in logged.get((schedule_id, day.isoformat()), ()):
+                if slot is None:
+                    legacy.append(taken_at)
+                else:
+                    taken[slot] = taken_at
+            for t in times.get(schedule_id, []):
+                if t not in taken and legacy:
+                    taken[t] = legacy.pop(0)
+                rows.append({
+                    'schedule_id': schedule_id,
+                    'user_id': user_id,
+                    'slot_date': day,
+                    'slot_time': t,
+                    'due_at': datetime.combine(day, t),
+                    'status': 'taken' if t in taken else 'pending',
+                    'taken_at': taken.get(t),
+                })
+            day += timedelta(days=1)
+    if rows:
+        db.session.execute(dialect_insert(DoseSlot).on_conflict_do_nothing(), rows)
+    return len(rows)
+
+
+def ensure_slots(user_id, today=None):
+    """读取前调用：已生成的时间点不足半个窗口的有效计划顺延一个窗口；无需顺延时只有一次查询"""
+    today = today or date.today()
+    window = _window_days()
+    refill_before = today + timedelta(days=window // 2)
+    pending = (
+        Schedule.query
+        .join(UserMedicine, Schedule.user_medicine_id == UserMedicine.id)
+        .filter(
+            UserMedicine.user_id == user_id,
+            Schedule.status == 'active',
+            Schedule.start_date <= today + timedelta(days=window),
+            or_(Schedule.slots_until.is_(None),
+                and_(Schedule.slots_until < Schedule.end_date, Schedule.slots_until < refill_before)),
+        )
+        .all()
+    )
+    if pending:
+        materialize(user_id, pending, today)
+        db.session.commit()
+
+
+def mark_slots_taken(taken):
+    """taken 为 [(schedule_id, date_str, slot_time, taken_at)]，与服药记录同一事务"""
+    if not taken:
+        return
+    stmt = (
+        update(DoseSlot.__table__)
+        .where(DoseSlot.schedule_id == bindparam('b_schedule_id'),
+               DoseSlot.slot_date == bindparam('b_slot_date'),
+               DoseSlot.slot_time == bindparam('b_slot_time'))
+        .values(status='taken', taken_at=bindparam('b_taken_at'))
+    )
+    db.session.execute(stmt, [
+        {'b_schedule_id': schedule_id, 'b_slot_date': date.fromisoformat(date_str),
+         'b_slot_time': slot, 'b_taken_at': taken_at}
+        for schedule_id, date_str, slot, taken_at in taken
+    ])
+
+
+def slot_query(user_id, start, end):
+    """[start, end) 内有效计划的时间点，附带剂量、药品名和药箱条目 id"""
+    return (
+        db.session.query(DoseSlot.schedule_id, DoseSlot.due_at, DoseSlot.status, DoseSlot.taken_at,
+                         Schedule.dose, Medicine.name, UserMedicine.id)
+        .join(Schedule, DoseSlot.schedule_id == Schedule.id)
+        .join(UserMedicine, Schedule.user_medicine_id == UserMedicine.id)
+        .join(Medicine, UserMedicine.medicine_id == Medicine.id)
+        .filter(DoseSlot.user_id == user_id, DoseSlot.due_at >= start, DoseSlot.due_at < end,
+                Schedule.status == 'active')
+    )
+
+
+def _slot_dict(row):
+    schedule_id, due_at, status, taken_at, dose, name, _ = row
+    return {
+        'schedule_id': schedule_id,
+        'medicine_name': name,
+        'dose': dose,
+        'date': due_at.date().isoformat(),
+        'time': due_at.strftime('%H:%M'),
+        'due_at': due_at.isoformat(timespec='minutes'),
+        'status': status,
+        'taken_at': taken_at.isoformat(timespec='seconds') if taken_at else None,
+    }
+
+
+def next_doses(user_id, now=None, limit=5):
+    """今天已到时间但还没服的（due），以及接下来的 limit 个时间点（upcoming）"""
+    now = now or datetime.now()
+    ensure_slots(user_id, now.date())
+    day_start = datetime.combine(now.date(), time.min)
+    due = (
+        slot_query(user_id, day_start, now + timedelta(seconds=1))
+        .filter(DoseSlot.status == 'pending')
+        .order_by(DoseSlot.due_at)
+        .all()
+    )
+    upcoming = (
+        slot_query(user_id, now + timedelta(seconds=1), now + timedelta(days=_window_days()))
+        .filter(DoseSlot.status == 'pending')
+        .order_by(DoseSlot.due_at)
+        .limit(limit)
+        .all()
+    )
+    return {
+        'now': now.isoformat(timespec='seconds'),
+        'due': [_slot_dict(row) for row in due],
+        'upcoming': [_slot_dict(row) for row in upcoming],
+    }
@@ -0,0 +1,6 @@
+from dotenv import load_dotenv
+load_dotenv()
+from app.asgi import create_asgi_app
+
+# 异步流式聊天入口：uvicorn asgi:app
+app = create_asgi_app()
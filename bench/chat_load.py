@@ -0,0 +1,91 @@
+"""流式聊天并发压测：同时打开 N 个 SSE 流，统计首帧时间、总时长和吞吐。
+
+    # 终端 1：假上游
+    python bench/fake_llm.py --port 8787
+    # 终端 2：同步（WSGI）或异步（ASGI）服务；所有流来自同一个 IP，需关闭限流
+    RATELIMIT_ENABLED=0 DEEPSEEK_API_KEY=fake DEEPSEEK_BASE_URL=http://127.0.0.1:8787 uvicorn asgi:app --port 8001
+    # 终端 3
+    python bench/chat_load.py --url http://127.0.0.1:8001/api/chat/deepseek --concurrency 200
+"""
+import sys
+import json
+import time
+import argparse
+import http.client
+from urllib.parse import urlsplit
+from concurrent.futures import ThreadPoolExecutor
+from stats import percentile
+
+
+def open_stream(url, model='deepseek-chat', timeout=300):
+    """发起一个聊天流并读到结束，返回单个流的统计"""
+    parts = urlsplit(url)
+    conn = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=timeout)
+    body = json.dumps({'model': model, 'messages': [{'role': 'user', 'content': '我头痛发热，怎么办？'}]})
+    start = time.perf_counter()
+    first = None
+    frames = 0
+    size = 0
+    try:
+        conn.request('POST', parts.path, body=body, headers={'Content-Type': 'application/json'})
+        response = conn.getresponse()
+        if response.status != 200:
+            return {'status': response.status, 'error': response.read()[:200].decode('utf-8', 'replace')}
+        while True:
+            line = response.readline()
+            if not line:
+                break
+            if line.startswith(b'data: '):
+                if first is None:
+                    first = time.perf_counter() - start
+                frames += 1
+                size += len(line)
+                if line.startswith(b'data: [DONE]'):
+                    break
+        return {'status': 200, 'ttfb': first, 'duration': time.perf_counter() - start, 'frames': frames, 'bytes': size}
+    except Exception as e:
+        return {'status': 0, 'error': f'{type(e).__name__}: {e}'}
+    finally:
+        conn.close()
+
+
+def run(url, concurrency=100, total=None, model='deepseek-chat'):
+    total = total or concurrency
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(lambda _: open_stream(url, model), range(total)))
+    elapsed = time.perf_counter() - start
+
+    ok = [r for r in results if r['status'] == 200]
+    ttfb = [r['ttfb'] for r in ok if r['ttfb'] is not None]
+    duration = [r['duration'] for r in ok]
+    rate_limited = sum(1 for r in results if r['status'] == 429)
+    if rate_limited:
+        print(f"warning: {rate_limited} of {total} streams got HTTP 429, the server is rate limiting; "
+              "start it with RATELIMIT_ENABLED=0 to measure streaming", file=sys.stderr)
+    return {
+        'url': url,
+        'concurrency': concurrency,
+        'streams': total,
+        'ok': len(ok),
+        'rate_limited': rate_limited,
+        'errors': {str(r['status']): r.get('error') for r in results if r['status'] not in (200, 429)},
+        'wall_seconds': round(elapsed, 3),
+        'streams_per_second': round(len(ok) / elapsed, 2) if elapsed else None,
+        'ttfb_p50_ms': round(percentile(ttfb, 50) * 1000, 1) if ttfb else None,
+        'ttfb_p99_ms': round(percentile(ttfb, 99) * 1000, 1) if ttfb else None,
+        'duration_p50_ms': round(percentile(duration, 50) * 1000, 1) if duration else None,
+        'duration_p99_ms': round(percentile(duration, 99) * 1000, 1) if duration else None,
+        'frames_per_stream': round(sum(r['frames'] for r in ok) / len(ok), 1) if ok else None,
+        'bytes_per_stream': round(sum(r['bytes'] for r in ok) / len(ok), 1) if ok else None,
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Concurrent SSE load test for /api/chat/deepseek')
+    parser.add_argument('--url', default='http://127.0.0.1:5000/api/chat/deepseek')
+    parser.add_argument('--concurrency', type=int, default=100)
+    parser.add_argument('--total', type=int, default=None, help='总流数，默认等于并发数')
+    parser.add_argument('--model', default='deepseek-chat')
+    args = parser.parse_args()
+    print(json.dumps(run(args.url, args.concurrency, args.total, args.model), ensure_ascii=False, indent=2))
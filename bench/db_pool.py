@@ -0,0 +1,88 @@
+"""数据库连接池模式基准：对比不同 DB_* 配置下每个请求的数据库延迟。
+
+    python bench/db_pool.py --requests 500 --concurrency 8
+    python bench/db_pool.py --database-url postgresql://postgres@127.0.0.1/mediguide_bench
+
+默认使用临时 SQLite 文件作替身；指向本地 PostgreSQL 时能真实反映连接建立、探活与 NullPool 的开销。
+请求走 /api/medicines/search（关闭目录缓存，确保每次都访问数据库）。
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from stats import percentile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SCENARIOS = {
+    'queue': {'DB_POOL_MODE': 'queue', 'DB_POOL_PRE_PING': '1'},
+    'queue-no-pre-ping': {'DB_POOL_MODE': 'queue', 'DB_POOL_PRE_PING': '0'},
+    'null': {'DB_POOL_MODE': 'null', 'DB_POOL_PRE_PING': '0'},
+}
+
+
+def seed(app, count=200):
+    from app.extensions import db
+    from app.importer import import_medicines
+    with app.app_context():
+        db.create_all()
+        import_medicines({'name': f'基准药品{i}', 'generic_name': f'bench{i}', 'indications': '头痛 发热',
+                          'dosage': '', 'contraindications': '', 'side_effects': '', 'precautions': ''}
+                         for i in range(count))
+
+
+def run_scenario(name, overrides, requests, concurrency):
+    os.environ.update(overrides)
+    from app import create_app
+    app = create_app()
+
+    def one(i):
+        client = app.test_client()
+        start = time.perf_counter()
+        status = client.get(f'/api/medicines/search?page={i % 8 + 1}&per_page=20').status_code
+        return status, time.perf_counter() - start
+
+    one(0)  # 预热：建立第一条连接、编译语句
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one, range(requests)))
+    elapsed = time.perf_counter() - start
+
+    latencies = [t for status, t in results if status == 200]
+    with app.app_context():
+        from app.extensions import db
+        db.engine.dispose()
+    return {
+        'scenario': name,
+        'ok': len(latencies),
+        'errors': len(results) - len(latencies),
+        'requests_per_second': round(len(results) / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 50) * 1000, 2) if latencies else None,
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2) if latencies else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare per-request DB latency across pool modes')
+    parser.add_argument('--database-url', default=None, help='默认使用临时 SQLite 文件')
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--scenario', action='append', choices=sorted(SCENARIOS), help='可重复指定，默认全部')
+    args = parser.parse_args()
+
+    url = args.database_url or 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+    os.environ.update(DATABASE_URL=url, AUTO_INIT_DB='0', CATALOG_CACHE_ENABLED='0')
+
+    from app import create_app
+    seed(create_app())
+
+    report = [run_scenario(name, SCENARIOS[name], args.requests, args.concurrency)
+              for name in (args.scenario or SCENARIOS)]
+    print(json.dumps({'database': url.split('@')[-1], 'results': report}, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
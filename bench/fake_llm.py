@@ -0,0 +1,121 @@
+"""本地的 OpenAI 兼容假上游，用于压测，不消耗真实 DeepSeek 额度。
+
+    python bench/fake_llm.py --port 8787 --tokens 200 --delay-ms 20
+    DEEPSEEK_API_KEY=fake DEEPSEEK_BASE_URL=http://127.0.0.1:8787 python run.py
+
+支持 POST /chat/completions（以及 /v1/chat/completions）的流式与非流式请求；
+model 为 deepseek-reasoner 时先输出 reasoning_content 再输出 content。
+"""
+import json
+import time
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+TOKEN = '好'
+CONSULT_ANSWER = {
+    'disease': '普通感冒（模拟）',
+    'advice': '1. 多休息，多喝温开水。',
+    'red_flags': '高热不退请立即就医。',
+}
+
+
+def make_handler(tokens, delay, ttft):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            if not self.path.rstrip('/').endswith('/chat/completions'):
+                self.send_error(404)
+                return
+            length = int(self.headers.get('Content-Length') or 0)
+            body = json.loads(self.rfile.read(length) or b'{}')
+            model = body.get('model', 'deepseek-chat')
+            if body.get('stream'):
+                self._stream(model)
+            else:
+                self._complete(model)
+
+        def _chunk(self, model, delta, finish_reason=None):
+            return {
+                'id': 'chatcmpl-fake', 'object': 'chat.completion.chunk', 'created': int(time.time()),
+                'model': model,
+                'choices': [{'index': 0, 'delta': delta, 'finish_reason': finish_reason}],
+            }
+
+        def _write(self, payload):
+            data = f"data: {payload}\n\n".encode('utf-8')
+            self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            self.wfile.flush()
+
+        def _stream(self, model):
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.end_headers()
+            time.sleep(ttft)
+            try:
+                self._write(json.dumps(self._chunk(model, {'role': 'assistant', 'content': ''})))
+                reasoning = tokens // 2 if model == 'deepseek-reasoner' else 0
+                for i in range(tokens):
+                    field = 'reasoning_content' if i < reasoning else 'content'
+                    self._write(json.dumps(self._chunk(model, {field: TOKEN}), ensure_ascii=False))
+                    time.sleep(delay)
+                self._write(json.dumps(self._chunk(model, {}, 'stop')))
+                self._write('[DONE]')
+                self.wfile.write(b"0\r\n\r\n")
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+        def _complete(self, model):
+            time.sleep(ttft + delay * tokens)
+            payload = json.dumps({
+                'id': 'chatcmpl-fake', 'object': 'chat.completion', 'created': int(time.time()), 'model': model,
+                'choices': [{'index': 0, 'finish_reason': 'stop',
+                             'message': {'role': 'assistant', 'content': json.dumps(CONSULT_ANSWER, ensure_ascii=False)}}],
+                'usage': {'prompt_tokens': 0, 'completion_tokens': tokens, 'total_tokens': tokens},
+            }, ensure_ascii=False).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+    return Handler
+
+
+class FakeServer(ThreadingHTTPServer):
+    # 默认的 listen 队列只有 5，数百个流同时连接时会在假上游处被拒绝或排队，而不是在被测服务上
+    request_queue_size = 1024
+
+
+def serve(port=8787, tokens=200, delay_ms=20, ttft_ms=200, background=False, backlog=None):
+    """启动假上游；background=True 时在守护线程中运行并返回 server，便于在压测脚本里直接拉起。
+
+    backlog 为 listen 队列长度，应不小于压测并发数（默认 1024）。
+    """
+    server_class = FakeServer
+    if backlog:
+        server_class = type('FakeServer', (FakeServer,), {'request_queue_size': backlog})
+    server = server_class(('127.0.0.1', port), make_handler(tokens, delay_ms / 1000, ttft_ms / 1000))
+    server.daemon_threads = True
+    if background:
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+    print(f"Fake OpenAI-compatible upstream on http://127.0.0.1:{port} ({tokens} tokens, {delay_ms} ms/token)")
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--port', type=int, default=8787)
+    parser.add_argument('--tokens', type=int, default=200, help='每个流输出的 token 数')
+    parser.add_argument('--delay-ms', type=float, default=20, help='相邻 token 的间隔')
+    parser.add_argument('--ttft-ms', type=float, default=200, help='首个 token 前的等待')
+    parser.add_argument('--backlog', type=int, default=FakeServer.request_queue_size,
+                        help='listen 队列长度，不小于 chat_load.py 的 --concurrency')
+    args = parser.parse_args()
+    serve(args.port, args.tokens, args.delay_ms, args.ttft_ms, backlog=args.backlog)
@@ -0,0 +1,79 @@
+"""冷启动基准：在全新的子进程中分别测量导入、create_app() 和首个请求的耗时。
+
+    python bench/startup.py --runs 5
+    python bench/startup.py --runs 5 --path /medicines --max-import-ms 800   # 超过阈值时退出码为 1
+
+每次运行都是独立的解释器，模拟 Serverless 冷启动；输出各阶段耗时的中位数，
+以及启动后是否已经加载了 openai / pandas 等重量级模块。
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = r'''
+import sys, time, json
+t0 = time.perf_counter()
+from app import create_app
+t1 = time.perf_counter()
+app = create_app()
+t2 = time.perf_counter()
+client = app.test_client()
+status = client.get(sys.argv[1]).status_code
+t3 = time.perf_counter()
+status2 = client.get(sys.argv[1]).status_code
+t4 = time.perf_counter()
+print(json.dumps({
+    'import_ms': (t1 - t0) * 1000,
+    'create_app_ms': (t2 - t1) * 1000,
+    'first_request_ms': (t3 - t2) * 1000,
+    'second_request_ms': (t4 - t3) * 1000,
+    'status': [status, status2],
+    'heavy_modules': sorted(m for m in ('openai', 'pandas', 'numpy') if m in sys.modules),
+}))
+'''
+
+
+def probe(path, env):
+    out = subprocess.run([sys.executable, '-c', PROBE, path], cwd=ROOT, env=env,
+                         capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure cold-start import and first-request latency')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--path', default='/')
+    parser.add_argument('--auto-init-db', choices=['0', '1'], default='0',
+                        help='是否在 create_app() 中建表（默认 0，即 Serverless 模式）')
+    parser.add_argument('--max-import-ms', type=float, default=None)
+    parser.add_argument('--max-first-request-ms', type=float, default=None)
+    args = parser.parse_args()
+
+    env = dict(os.environ, AUTO_INIT_DB=args.auto_init_db)
+    if args.auto_init_db == '0':
+        # 先在同一个库上建好表，之后的冷启动只测应用本身
+        subprocess.run([sys.executable, '-m', 'flask', '--app', 'run', 'init-db'], cwd=ROOT, env=env,
+                       capture_output=True, check=True)
+
+    runs = [probe(args.path, env) for _ in range(args.runs)]
+    report = {'path': args.path, 'runs': args.runs, 'auto_init_db': args.auto_init_db == '1'}
+    for key in ('import_ms', 'create_app_ms', 'first_request_ms', 'second_request_ms'):
+        report[key] = round(statistics.median(r[key] for r in runs), 1)
+    report['status'] = runs[-1]['status']
+    report['heavy_modules'] = runs[-1]['heavy_modules']
+    print(json.dumps(report, indent=2))
+
+    failed = (
+        (args.max_import_ms is not None and report['import_ms'] > args.max_import_ms)
+        or (args.max_first_request_ms is not None and report['first_request_ms'] > args.max_first_request_ms)
+    )
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,10 @@
+"""各基准脚本共用的统计函数，保证不同报告中的 p50 / p99 按同一口径计算。"""
+import math
+
+
+def percentile(values, p):
+    """最近秩法（nearest-rank）百分位：排序后第 ceil(p% × n) 个值；没有数据时返回 None"""
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values), max(1, math.ceil(p / 100 * len(values)))) - 1]
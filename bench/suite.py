@@ -0,0 +1,257 @@
+"""端到端基准：合成数据集 + create_app() + 本地假上游，逐个接口测吞吐与延迟，输出可比较的 JSON 报告。
+
+    python bench/suite.py                                   # 临时 SQLite，默认规模
+    python bench/suite.py --users 10000 --days 180 --output reports/$(git rev-parse --short HEAD).json
+    python bench/suite.py --database-url postgresql://postgres@127.0.0.1/mediguide_bench --reuse
+    python bench/suite.py --scenario dashboard --scenario my_medicines --max-queries my_medicines=4
+
+请求经 Flask test client 在进程内发出（不经过网络与 WSGI 服务器），每个请求随机扮演一个用户；
+每个场景先预热再计时，报告吞吐、p50 / p90 / p99 延迟和每个请求的 SQL 条数。
+每个请求的 SQL 条数超出上限（DEFAULT_MAX_QUERIES 或 --max-queries）时退出码为 1，可在 CI 中防止 N+1 查询回归。
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import tempfile
+import threading
+import subprocess
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from stats import percentile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'bench'))
+
+SYMPTOMS = ['头痛 发热', '咳嗽 有痰', '流鼻涕 咽痛', '腹泻 腹痛', '胃痛 反酸', '失眠 多梦', '皮肤瘙痒 过敏']
+
+
+class Context:
+    """各场景共用的数据：用户及其计划 id、按线程统计的 SQL 条数"""
+
+    def __init__(self, app):
+        from app.extensions import db
+        from app.models import Medicine, Schedule, UserMedicine
+        self.app = app
+        with app.app_context():
+            rows = db.session.query(UserMedicine.user_id, Schedule.id).join(
+                Schedule, Schedule.user_medicine_id == UserMedicine.id).all()
+            self.medicine_pages = max(1, -(-Medicine.query.count() // app.config['MEDICINES_PER_PAGE']))
+            engine = db.engine
+        self.schedules = {}
+        for user_id, schedule_id in rows:
+            self.schedules.setdefault(user_id, []).append(schedule_id)
+        self.users = sorted(self.schedules)
+        self._local = threading.local()
+
+        from sqlalchemy import event
+        event.listen(engine, 'before_cursor_execute', self._count)
+
+    def _count(self, *args):
+        self._local.queries = getattr(self._local, 'queries', 0) + 1
+
+    def reset_queries(self):
+        self._local.queries = 0
+
+    @property
+    def queries(self):
+        return getattr(self._local, 'queries', 0)
+
+
+def dashboard(client, rng, ctx, user):
+    return client.get('/dashboard')
+
+
+def medicines(client, rng, ctx, user):
+    if rng.random() < 0.5:
+        return client.get(f'/medicines?page={rng.randint(1, min(ctx.medicine_pages, 20))}')
+    return client.get('/medicines?q=' + rng.choice(SYMPTOMS).split()[0])
+
+
+def my_medicines(client, rng, ctx, user):
+    return client.get('/my_medicines')
+
+
+def my_medicines_api(client, rng, ctx, user):
+    return client.get('/api/my_medicines')
+
+
+def ai_consult(client, rng, ctx, user):
+    return client.post('/api/ai_consult', json={'symptom': rng.choice(SYMPTOMS)})
+
+
+def chat(client, rng, ctx, user):
+    return client.post('/api/chat/deepseek', json={
+        'messages': [{'role': 'user', 'content': rng.choice(SYMPTOMS) + '，怎么办？'}]})
+
+
+def mark_taken(client, rng, ctx, user):
+    return client.post(f'/schedule/mark_taken/{rng.choice(ctx.schedules[user])}', json={})
+
+
+# 每个场景：(请求函数, 视为成功的状态码)
+SCENARIOS = {
+    'dashboard': (dashboard, {200}),
+    'medicines': (medicines, {200}),
+    'my_medicines': (my_medicines, {200}),
+    'my_medicines_api': (my_medicines_api, {200}),
+    'ai_consult': (ai_consult, {200}),
+    'chat': (chat, {200}),
+    'mark_taken': (mark_taken, {200, 409}),  # 409：当天已全部服用，同样是正常结果
+}
+
+# 默认的每请求 SQL 条数上限（项目没有单元测试，由基准承担回归检查）：
+# 药箱页固定为计数、条目 + 药品、有效计划三条，与药箱大小无关
+DEFAULT_MAX_QUERIES = {'my_medicines': 3, 'my_medicines_api': 3}
+
+
+def run_scenario(ctx, name, requests, concurrency, warmup, seed):
+    func, accepted = SCENARIOS[name]
+    local = threading.local()
+
+    def one(i):
+        rng = random.Random(seed * 1000003 + i)
+        client = getattr(local, 'client', None)
+        if client is None:
+            client = local.client = ctx.app.test_client()
+        # 直接写入会话扮演用户，登录的密码哈希不计入耗时
+        user = rng.choice(ctx.users)
+        with client.session_transaction() as sess:
+            sess['user_id'] = user
+            sess['nickname'] = f'bench{user}'
+        ctx.reset_queries()
+        start = time.perf_counter()
+        response = func(client, rng, ctx, user)
+        response.get_data()  # 流式响应读到结束
+        elapsed = time.perf_counter() - start
+        return response.status_code, elapsed, ctx.queries
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(-warmup, 0)))
+        start = time.perf_counter()
+        results = list(pool.map(one, range(requests)))
+        wall = time.perf_counter() - start
+
+    latencies = [t for status, t, _ in results if status in accepted]
+    queries = [q for status, _, q in results if status in accepted]
+    statuses = {}
+    for status, _, _ in results:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    report = {
+        'requests': requests,
+        'ok': len(latencies),
+        'statuses': statuses,
+        'requests_per_second': round(requests / wall, 1),
+    }
+    if latencies:
+        report.update({
+            'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+            'p90_ms': round(percentile(latencies, 90) * 1000, 2),
+            'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+            'mean_ms': round(sum(latencies) / len(latencies) * 1000, 2),
+            'queries_per_request': round(sum(queries) / len(queries), 2),
+            'max_queries': max(queries),
+        })
+    return report
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark MediGuide endpoints against a synthetic dataset')
+    parser.add_argument('--database-url', default=None, help='默认使用临时 SQLite 文件')
+    parser.add_argument('--reuse', action='store_true', help='库中已有数据时直接使用，不再生成')
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--medicines', type=int, default=2000)
+    parser.add_argument('--cabinet', type=int, default=3)
+    parser.add_argument('--days', type=int, default=90)
+    parser.add_argument('--requests', type=int, default=300, help='每个场景的请求数')
+    parser.add_argument('--warmup', type=int, default=20)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--scenario', action='append', choices=sorted(SCENARIOS), help='可重复指定，默认全部')
+    parser.add_argument('--llm-tokens', type=int, default=50)
+    parser.add_argument('--llm-delay-ms', type=float, default=2)
+    parser.add_argument('--llm-ttft-ms', type=float, default=50)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', default=None, help='同时把报告写入该文件')
+    parser.add_argument('--max-queries', action='append', default=[], metavar='SCENARIO=N',
+                        help='单个请求的 SQL 条数上限（覆盖默认值），超出时退出码为 1')
+    args = parser.parse_args()
+
+    from fake_llm import serve
+    server = serve(0, args.llm_tokens, args.llm_delay_ms, args.llm_ttft_ms, background=True)
+    url = args.database_url or 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+    os.environ.update(
+        DATABASE_URL=url,
+        AUTO_INIT_DB='0',
+        RATELIMIT_ENABLED='0',  # 基准测的是接口本身，限流另行配置
+        DEEPSEEK_API_KEY='fake',
+        DEEPSEEK_BASE_URL=f'http://127.0.0.1:{server.server_address[1]}',
+    )
+
+    from app import create_app
+    from app.extensions import db
+    from app.models import User
+    from dataset import seed
+    app = create_app()
+    rows = None
+    seed_seconds = None
+    with app.app_context():
+        db.create_all()
+        if not (args.reuse and User.query.first() is not None):
+            started = time.perf_counter()
+            rows = seed(args.users, args.medicines, args.cabinet, days=args.days, seed=args.seed)
+            seed_seconds = round(time.perf_counter() - started, 1)
+
+    ctx = Context(app)
+    results = {}
+    for name in args.scenario or SCENARIOS:
+        results[name] = run_scenario(ctx, name, args.requests, args.concurrency, args.warmup, args.seed)
+
+    report = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'git_revision': git_revision(),
+            'python': platform.python_version(),
+            'database': url.split('://')[0],
+            'dataset': rows or 'reused',
+            'seed_seconds': seed_seconds,
+            'requests': args.requests,
+            'concurrency': args.concurrency,
+            'llm': {'tokens': args.llm_tokens, 'delay_ms': args.llm_delay_ms, 'ttft_ms': args.llm_ttft_ms},
+        },
+        'results': results,
+    }
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    print(text)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+
+    limits = dict(DEFAULT_MAX_QUERIES)
+    for limit in args.max_queries:
+        name, _, n = limit.partition('=')
+        limits[name] = int(n)
+    failed = []
+    for name, n in limits.items():
+        got = results.get(name, {}).get('max_queries')
+        if got is not None and got > n:
+            failed.append(f'{name}: {got} queries > {n}')
+    for line in failed:
+        print('FAIL ' + line, file=sys.stderr)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
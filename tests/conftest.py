@@ -0,0 +1,17 @@
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    """指向临时 SQLite 库的应用，不自动建表、不导入种子数据"""
+    monkeypatch.setenv('DATABASE_URL', 'sqlite:///' + str(tmp_path / 'test.db'))
+    monkeypatch.setenv('AUTO_INIT_DB', '0')
+    monkeypatch.setenv('METRICS_ENABLED', '0')
+    from app import create_app
+    app = create_app()
+    with app.app_context():
+        yield app
@@ -0,0 +1,37 @@
+from app.extensions import db
+from app.importer import import_medicines, read_records
+from app.models import Medicine
+
+
+def test_partial_columns_only_update_those_columns(app, tmp_path):
+    db.create_all()
+    db.session.add_all([
+        Medicine(name='布洛芬缓释胶囊', generic_name='布洛芬', indications='头痛', dosage='口服', side_effects='胃肠不适'),
+        Medicine(name='阿莫西林胶囊', generic_name='阿莫西林', indications='感染', dosage='口服'),
+    ])
+    db.session.commit()
+    source = tmp_path / 'partial.csv'
+    source.write_text('name,indications\n布洛芬缓释胶囊,发热、头痛\n阿莫西林胶囊,感染\n新药片,咳嗽\n', encoding='utf-8')
+
+    report = import_medicines(read_records(str(source)))
+
+    assert (report['added'], report['updated'], report['unchanged']) == (1, 1, 1)
+    db.session.expire_all()
+    ibuprofen = Medicine.query.filter_by(name='布洛芬缓释胶囊').one()
+    assert ibuprofen.indications == '发热、头痛'
+    assert (ibuprofen.generic_name, ibuprofen.dosage, ibuprofen.side_effects) == ('布洛芬', '口服', '胃肠不适')
+    assert Medicine.query.filter_by(name='阿莫西林胶囊').one().generic_name == '阿莫西林'
+    assert Medicine.query.filter_by(name='新药片').one().generic_name == ''
+
+
+def test_updates_with_different_changed_fields_in_one_batch(app):
+    db.create_all()
+    db.session.add_all([Medicine(name='甲', generic_name='a', indications='x'),
+                        Medicine(name='乙', generic_name='b', indications='y')])
+    db.session.commit()
+
+    report = import_medicines([{'name': '甲', 'generic_name': 'a2'}, {'name': '乙', 'indications': 'y2'}])
+
+    assert report['updated'] == 2
+    db.session.expire_all()
+    assert [(m.generic_name, m.indications) for m in Medicine.query.order_by(Medicine.id)] == [('a2', 'x'), ('b', 'y2')]
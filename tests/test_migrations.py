@@ -0,0 +1,41 @@
+import datetime
+import pytest
+from sqlalchemy import text
+from app.extensions import db
+from app.migrations import upgrade_schema
+from app.models import Schedule
+
+
+def _legacy_schedules(rows):
+    """模拟旧版本写入的计划：起止日期按原样存为文本，可能是空字符串"""
+    db.create_all()
+    db.session.execute(text("INSERT INTO users (id, nickname) VALUES (1, 'u')"))
+    db.session.execute(text("INSERT INTO medicines (id, name) VALUES (1, 'm')"))
+    db.session.execute(text(
+        "INSERT INTO user_medicines (id, user_id, medicine_id, added_at) VALUES (1, 1, 1, '2024-03-02 08:00:00.000000')"))
+    for schedule_id, start, end in rows:
+        db.session.execute(text(
+            "INSERT INTO schedules (id, user_medicine_id, start_date, end_date, time_of_day, dose, status)"
+            " VALUES (:id, 1, :start, :end, '08:00,20:00', '1片', 'active')"),
+            {'id': schedule_id, 'start': start, 'end': end})
+    db.session.commit()
+
+
+def test_upgrade_fills_empty_dates_on_sqlite(app):
+    _legacy_schedules([(1, '', ''), (2, ' 2024-03-05 ', '')])
+    report = upgrade_schema()
+    assert report['filled_schedule_dates'] == 3
+    assert report['backfilled_schedules'] == 2
+    db.session.expire_all()
+    first, second = db.session.get(Schedule, 1), db.session.get(Schedule, 2)
+    assert (first.start_date, first.end_date) == (datetime.date(2024, 3, 2), datetime.date(2024, 3, 2))
+    assert (second.start_date, second.end_date) == (datetime.date(2024, 3, 5), datetime.date(2024, 3, 5))
+    assert first.times == ['08:00', '20:00']
+    # 可重复执行
+    assert upgrade_schema()['filled_schedule_dates'] == 0
+
+
+def test_upgrade_reports_malformed_dates(app):
+    _legacy_schedules([(1, '2024-03-02', '2024-03-09'), (7, '2024/3/2', '2024-03-09')])
+    with pytest.raises(RuntimeError, match=r'schedules\.start_date .*\[7\]'):
+        upgrade_schema()